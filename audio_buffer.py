@@ -0,0 +1,321 @@
+import mmap
+import os
+import tempfile
+import threading
+import numpy as np
+from pcm import PcmEncoder
+
+
+class AudioBuffer:
+    """Growable float32 sample buffer written by the audio callback without allocating"""
+    def __init__(self, initial_seconds=60, sample_rate=16000, on_low_space=None):
+        self.sample_rate = sample_rate
+        self._data = np.empty(int(initial_seconds * sample_rate), dtype=np.float32)
+        self._length = 0
+        self._lock = threading.Lock()
+        # Capacity is doubled ahead of time by a non-realtime thread calling
+        # reserve() once the buffer is half full, so the callback only copies
+        # into existing memory. on_low_space is how the writer asks for that.
+        self.on_low_space = on_low_space
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    def write(self, block):
+        """Append samples; intended to be called from the audio callback"""
+        n = len(block)
+        with self._lock:
+            end = self._length + n
+            if end > len(self._data):
+                # The grower fell behind - grow inline rather than drop audio
+                self._data = self._grown(self._data, self._length, end)
+            self._data[self._length:end] = block
+            self._length = end
+            low_space = end * 2 >= len(self._data)
+
+        if low_space and self.on_low_space:
+            self.on_low_space()
+
+    def reserve(self):
+        """Double the capacity if the buffer is at least half full; call off the audio thread"""
+        with self._lock:
+            old = self._data
+            copied = self._length
+            if copied * 2 < len(old):
+                return
+
+        # Copy the bulk of the samples without blocking the writer
+        new = np.empty(len(old) * 2, dtype=np.float32)
+        new[:copied] = old[:copied]
+
+        with self._lock:
+            if self._data is not old:
+                return
+            # Pick up anything written while copying
+            new[copied:self._length] = old[copied:self._length]
+            self._data = new
+
+    def view(self, start=0, end=None):
+        """Return a zero-copy view of the samples in [start, end)"""
+        with self._lock:
+            if end is None or end > self._length:
+                end = self._length
+            return self._data[start:end]
+
+    def audio(self):
+        """The recording for transcription; same as view() for an in-memory buffer"""
+        return self.view()
+
+    @staticmethod
+    def _grown(data, length, needed):
+        """Return a larger copy of data holding at least `needed` samples"""
+        new = np.empty(max(needed, len(data) * 2), dtype=np.float32)
+        new[:length] = data[:length]
+        return new
+
+
+class RingBuffer:
+    """Fixed-capacity float32 ring that keeps the most recent samples
+
+    Not locked; the owner serializes writes and reads (see AudioRecorder).
+    """
+    def __init__(self, capacity):
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self._pos = 0
+        self._filled = 0
+
+    def __len__(self):
+        return self._filled
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    def write(self, block):
+        """Append samples, overwriting the oldest once full"""
+        capacity = len(self._data)
+        n = len(block)
+        if n >= capacity:
+            self._data[:] = block[n - capacity:]
+            self._pos = 0
+            self._filled = capacity
+            return
+
+        first = min(n, capacity - self._pos)
+        self._data[self._pos:self._pos + first] = block[:first]
+        self._data[:n - first] = block[first:]
+        self._pos = (self._pos + n) % capacity
+        self._filled = min(capacity, self._filled + n)
+
+    def read(self):
+        """Return the buffered samples, oldest first, as a new array"""
+        if self._filled < len(self._data):
+            return self._data[self._pos - self._filled:self._pos].copy()
+        return np.concatenate((self._data[self._pos:], self._data[:self._pos]))
+
+    def clear(self):
+        self._pos = 0
+        self._filled = 0
+
+
+class SpillBuffer:
+    """Recording buffer that moves to int16 memory-mapped files past a RAM threshold
+
+    Behaves like AudioBuffer until ram_bytes of float32 audio is held; reserve()
+    then copies the samples to disk as int16 and later writes go straight into
+    the mapping, so memory use stops growing with the recording. The spill is
+    made of fixed-size segment files that are allocated whole and never
+    resized, since Windows refuses to resize a file while it is mapped.
+    """
+    def __init__(self, ram_bytes=64 * 1024 * 1024, sample_rate=16000, directory=None,
+                 on_low_space=None, initial_seconds=60, segment_seconds=600):
+        self.sample_rate = sample_rate
+        self.ram_samples = max(1, ram_bytes // 4)
+        self.directory = directory
+        self.segment_samples = int(segment_seconds * sample_rate)
+        self.paths = []
+        self._data = np.empty(min(int(initial_seconds * sample_rate), self.ram_samples), dtype=np.float32)
+        # (mmap, int16 array over it) per segment file, in recording order
+        self._segments = []
+        self._spilled = False
+        self._length = 0
+        self._lock = threading.Lock()
+        # The writer and the reserving thread each convert with their own scratch
+        self._write_encoder = PcmEncoder(sample_rate)
+        self._spill_encoder = PcmEncoder(sample_rate)
+        self.on_low_space = on_low_space
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def capacity(self):
+        return len(self._segments) * self.segment_samples if self._spilled else len(self._data)
+
+    @property
+    def spilled(self):
+        return self._spilled
+
+    def write(self, block):
+        """Append samples; intended to be called from the audio callback"""
+        n = len(block)
+        with self._lock:
+            end = self._length + n
+            if not self._spilled:
+                if end > len(self._data):
+                    # reserve() fell behind - grow in RAM rather than drop audio
+                    self._data = AudioBuffer._grown(self._data, self._length, end)
+                self._data[self._length:end] = block
+                # Ask for a spill with a quarter of the threshold still free
+                low_space = end * 2 >= len(self._data) or end * 4 >= self.ram_samples * 3
+            else:
+                while end > self.capacity:
+                    # reserve() fell behind - add a segment inline rather than drop audio
+                    self._segments.append(self._new_segment())
+                for position, out in self._mapped(self._length, end):
+                    offset = position - self._length
+                    self._write_encoder.to_int16(block[offset:offset + len(out)], out)
+                low_space = self.capacity - end < self.segment_samples // 2
+            self._length = end
+
+        if low_space and self.on_low_space:
+            self.on_low_space()
+
+    def reserve(self):
+        """Grow the RAM buffer, spill it to disk, or add a segment; call off the audio thread"""
+        with self._lock:
+            length = self._length
+            data = self._data
+            spilled = self._spilled
+            capacity = self.capacity
+
+        if spilled:
+            if capacity - length < self.segment_samples // 2:
+                segment = self._new_segment()
+                with self._lock:
+                    self._segments.append(segment)
+            return
+
+        if length * 4 >= self.ram_samples * 3:
+            self._spill()
+        elif length * 2 >= len(data):
+            new = np.empty(min(len(data) * 2, self.ram_samples), dtype=np.float32)
+            new[:length] = data[:length]
+            with self._lock:
+                if self._data is data:
+                    new[length:self._length] = data[length:self._length]
+                    self._data = new
+
+    def view(self, start=0, end=None):
+        """Return samples in [start, end): a zero-copy view in RAM, a float32 copy once spilled"""
+        with self._lock:
+            if end is None or end > self._length:
+                end = self._length
+            if not self._spilled:
+                return self._data[start:end]
+            out = np.empty(max(0, end - start), dtype=np.float32)
+            for position, samples in self._mapped(start, end):
+                np.multiply(samples, 1 / 32768, out=out[position - start:position - start + len(samples)],
+                            casting='unsafe')
+            return out
+
+    def audio(self):
+        """The recording for transcription: an array in RAM, or a SpilledAudio once spilled"""
+        with self._lock:
+            if not self._spilled:
+                return self._data[:self._length]
+            for mapping, _ in self._segments:
+                mapping.flush()
+            return SpilledAudio(self, self._length)
+
+    def close(self):
+        """Unmap and delete the spill files"""
+        with self._lock:
+            segments, self._segments = self._segments, []
+        # Reads hand out copies, so nothing else should hold a view into the mappings
+        mappings = [mapping for mapping, _ in segments]
+        del segments
+        for mapping in mappings:
+            try:
+                mapping.close()
+            except BufferError:
+                print("Spill file still in use; leaving it for the OS to clean up")
+                return
+        for path in self.paths:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Could not remove spill file {path}: {e}")
+        self.paths = []
+
+    def _spill(self):
+        """Copy the RAM samples to new int16 segment files and switch writes to them"""
+        with self._lock:
+            copied = self._length
+            data = self._data
+        # Room for what is recorded so far plus at least one free segment
+        segments = [self._new_segment() for _ in range(copied // self.segment_samples + 2)]
+
+        # Convert the bulk without blocking the writer
+        for position, out in self._slices(segments, self.segment_samples, 0, copied):
+            self._spill_encoder.to_int16(data[position:position + len(out)], out)
+        with self._lock:
+            # Pick up anything written while converting
+            for position, out in self._slices(segments, self.segment_samples, copied, self._length):
+                self._spill_encoder.to_int16(self._data[position:position + len(out)], out)
+            self._segments = segments
+            self._spilled = True
+            self._data = np.empty(0, dtype=np.float32)
+        print(f"Recording passed {self.ram_samples * 4 / 1024 / 1024:.0f} MB - spilling to {self.paths[0]}")
+
+    def _new_segment(self):
+        """Create one spill file at its full size and map it"""
+        fd, path = tempfile.mkstemp(prefix='whisper-spill-', suffix='.pcm', dir=self.directory)
+        try:
+            os.ftruncate(fd, self.segment_samples * 2)
+            mapping = mmap.mmap(fd, self.segment_samples * 2)
+        finally:
+            # The mapping keeps its own handle to the file
+            os.close(fd)
+        self.paths.append(path)
+        return mapping, np.frombuffer(mapping, dtype=np.int16)
+
+    def _mapped(self, start, end):
+        return self._slices(self._segments, self.segment_samples, start, end)
+
+    @staticmethod
+    def _slices(segments, segment_samples, start, end):
+        """Yield (position, int16 view) pieces covering [start, end) across segments"""
+        while start < end:
+            index, offset = divmod(start, segment_samples)
+            n = min(end - start, segment_samples - offset)
+            yield start, segments[index][1][offset:offset + n]
+            start += n
+
+    def __del__(self):
+        if getattr(self, 'paths', None):
+            self.close()
+
+
+class SpilledAudio:
+    """A finished recording held in a SpillBuffer's file, read back in chunks"""
+    def __init__(self, owner, length):
+        self._owner = owner
+        self._length = length
+        self.sample_rate = owner.sample_rate
+
+    def __len__(self):
+        return self._length
+
+    def read(self, start, end):
+        """Return samples in [start, end) as float32"""
+        return self._owner.view(start, min(end, self._length))
+
+    def close(self):
+        """Delete the backing file once the recording has been transcribed"""
+        self._owner.close()
+
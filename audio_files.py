@@ -0,0 +1,149 @@
+import glob
+import os
+import shutil
+import struct
+import subprocess
+import wave
+import numpy as np
+from resample import resample_audio
+
+SAMPLE_RATE = 16000
+AUDIO_EXTENSIONS = ('.wav', '.npy')
+# Decoded through ffmpeg when it is on the PATH
+FFMPEG_EXTENSIONS = ('.mp3', '.m4a', '.flac', '.ogg', '.opus', '.webm', '.mp4', '.aac', '.wma')
+
+
+def find_audio_files(patterns):
+    """Expand files, directories and globs into a sorted list of supported audio files"""
+    extensions = AUDIO_EXTENSIONS + (FFMPEG_EXTENSIONS if shutil.which('ffmpeg') else ())
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths = sorted(os.path.join(pattern, name) for name in os.listdir(pattern))
+        elif any(ch in pattern for ch in '*?['):
+            paths = sorted(glob.glob(pattern, recursive=True))
+        else:
+            paths = [pattern]
+        found.extend(path for path in paths
+                     if path.lower().endswith(extensions) and os.path.isfile(path))
+    # Drop duplicates while keeping order
+    return list(dict.fromkeys(found))
+
+
+def load_audio(path, sample_rate=SAMPLE_RATE):
+    """Load a WAV or NPY clip (or anything ffmpeg decodes) as mono float32 at sample_rate"""
+    if path.lower().endswith(FFMPEG_EXTENSIONS):
+        return _load_with_ffmpeg(path, sample_rate)
+    if path.lower().endswith('.npy'):
+        # NPY clips are expected to be float32 audio at the target rate already
+        audio = np.load(path).astype(np.float32, copy=False)
+        return audio.reshape(-1) if audio.ndim == 1 else audio.mean(axis=1, dtype=np.float32)
+
+    return decode_wav(path, sample_rate)
+
+
+def decode_wav(source, sample_rate=SAMPLE_RATE):
+    """Decode a WAV file path or file object to mono float32 at sample_rate"""
+    with wave.open(source, 'rb') as wav_file:
+        channels = wav_file.getnchannels()
+        width = wav_file.getsampwidth()
+        rate = wav_file.getframerate()
+        frames = wav_file.readframes(wav_file.getnframes())
+    return decode_pcm(frames, rate, width, channels, sample_rate)
+
+
+def decode_pcm(frames, rate, width=2, channels=1, sample_rate=SAMPLE_RATE, float_samples=False):
+    """Convert interleaved little-endian PCM bytes to mono float32 at sample_rate"""
+    if float_samples:
+        audio = np.frombuffer(frames, dtype='<f4', count=len(frames) // 4).astype(np.float32, copy=False)
+    else:
+        audio = _pcm_to_float(frames[:len(frames) - len(frames) % width], width)
+    if channels > 1:
+        audio = audio[:len(audio) - len(audio) % channels]
+        audio = audio.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    if rate != sample_rate:
+        audio = resample_audio(audio, rate, sample_rate)
+    return audio
+
+
+def parse_wav_header(data):
+    """Return (rate, channels, width, data_offset) from the start of a PCM WAV stream
+
+    Returns None until enough bytes have arrived to reach the data chunk.
+    """
+    if len(data) < 12:
+        return None
+    if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        raise ValueError("Not a WAV stream")
+    position = 12
+    fmt = None
+    while position + 8 <= len(data):
+        chunk_id = data[position:position + 4]
+        size = int.from_bytes(data[position + 4:position + 8], 'little')
+        if chunk_id == b'data':
+            if fmt is None:
+                raise ValueError("WAV data chunk before fmt chunk")
+            return fmt + (position + 8,)
+        if position + 8 + size > len(data):
+            return None
+        if chunk_id == b'fmt ':
+            body = data[position + 8:position + 8 + size]
+            tag, channels, rate = struct.unpack('<HHI', body[:8])
+            bits = struct.unpack('<H', body[14:16])[0]
+            # 1 is integer PCM; 0xFFFE (extensible) is accepted for its integer formats
+            if tag not in (1, 0xFFFE):
+                raise ValueError(f"Unsupported WAV format tag {tag}")
+            fmt = (rate, channels, bits // 8)
+        # Chunks are padded to an even size
+        position += 8 + size + (size & 1)
+    return None
+
+
+def synthetic_speech(seconds, sample_rate=SAMPLE_RATE, seed=0):
+    """Generate speech-like audio: harmonic bursts separated by short pauses over noise"""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    audio = rng.standard_normal(n).astype(np.float32) * 0.002
+
+    position = int(0.3 * sample_rate)
+    while position < n:
+        length = int(rng.uniform(0.15, 0.6) * sample_rate)
+        end = min(n, position + length)
+        t = np.arange(end - position, dtype=np.float32) / sample_rate
+        pitch = rng.uniform(100, 220)
+        burst = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 5))
+        envelope = np.hanning(end - position).astype(np.float32)
+        audio[position:end] += 0.2 * burst * envelope
+        position = end + int(rng.uniform(0.05, 0.5) * sample_rate)
+    return audio
+
+
+def _load_with_ffmpeg(path, sample_rate):
+    """Decode any ffmpeg-supported file to mono float32 through a pipe"""
+    if not shutil.which('ffmpeg'):
+        raise RuntimeError(f"ffmpeg is needed to read {os.path.basename(path)}")
+    result = subprocess.run(
+        ['ffmpeg', '-nostdin', '-v', 'error', '-i', path,
+         '-f', 'f32le', '-ac', '1', '-ar', str(sample_rate), '-'],
+        capture_output=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed on {path}: {result.stderr.decode(errors='replace')}")
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def _pcm_to_float(frames, width):
+    """Convert little-endian PCM bytes of the given sample width to float32"""
+    if width == 1:
+        return (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    if width == 2:
+        return np.frombuffer(frames, dtype='<i2').astype(np.float32) / 32768
+    if width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        ints = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8)
+                | (raw[:, 2].astype(np.int32) << 16))
+        ints = np.where(ints >= 1 << 23, ints - (1 << 24), ints)
+        return ints.astype(np.float32) / (1 << 23)
+    if width == 4:
+        return np.frombuffer(frames, dtype='<i4').astype(np.float32) / 2147483648
+    raise ValueError(f"Unsupported WAV sample width: {width} bytes")
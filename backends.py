@@ -0,0 +1,114 @@
+import asyncio
+from dataclasses import dataclass
+import numpy as np
+from segments import clean_segments, join_segments
+
+BACKEND_KINDS = ('auto', 'native', 'server', 'subprocess', 'stub')
+
+
+@dataclass(frozen=True)
+class Capabilities:
+    """What a backend can do, for callers choosing how to use it"""
+    # Segments carry real timestamps rather than one span for the whole clip
+    timestamps: bool = False
+    # Segments carry a token-probability confidence
+    confidence: bool = False
+    # The model stays loaded between calls
+    persistent: bool = False
+    # Several transcriptions can run at once on one instance
+    concurrent: bool = False
+    # whisper.cpp threads per transcription, i.e. the cores one call occupies
+    threads: int = 1
+
+
+class Backend:
+    """Contract shared by every transcription backend
+
+    Subclasses implement transcribe_segments(); transcribe(), the async
+    variants, warm_up() and close() have working defaults.
+    """
+    capabilities = Capabilities()
+    # The create_backend() kind that builds this backend, e.g. for pool workers
+    kind = None
+
+    def transcribe_segments(self, audio_data):
+        """Transcribe float32 16 kHz mono audio into a list of Segments"""
+        raise NotImplementedError
+
+    def transcribe(self, audio_data):
+        """Transcribe audio into text, without non-speech markers"""
+        return join_segments(clean_segments(self.transcribe_segments(audio_data)))
+
+    async def transcribe_async(self, audio_data):
+        """transcribe() on a worker thread, for asyncio callers"""
+        return await asyncio.to_thread(self.transcribe, audio_data)
+
+    async def transcribe_segments_async(self, audio_data):
+        """transcribe_segments() on a worker thread, for asyncio callers"""
+        return await asyncio.to_thread(self.transcribe_segments, audio_data)
+
+    def warm_up(self, seconds=2.0, sample_rate=16000):
+        """Run a dummy inference so the first real one doesn't pay for loading"""
+        self.transcribe(np.zeros(int(seconds * sample_rate), dtype=np.float32))
+
+    def close(self):
+        """Release processes, contexts or files held by the backend"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def create_backend(model_path, kind='auto', n_threads=4, exe_path=None, cache=None, confidence=False):
+    """Create a transcription backend for one model file, optionally behind a TranscriptCache
+
+    confidence asks for per-segment confidences even where they cost extra,
+    i.e. from a whisper.cpp process per utterance.
+    """
+    backend = _create_backend(model_path, kind, n_threads, exe_path, confidence)
+    if cache is None:
+        return backend
+    from transcript_cache import CachedBackend
+    # Entries cached without confidences mustn't answer callers that want them
+    return CachedBackend(backend, cache, model_path, params={'confidence': True} if confidence else None)
+
+
+def _create_backend(model_path, kind, n_threads, exe_path, confidence):
+    # 'auto' tries the in-process binding, then a persistent server, then a
+    # whisper.cpp process per utterance
+    import whisper_wrapper
+    from subprocess_whisper import SubprocessWhisper, PersistentWhisper, is_server_executable
+
+    if kind == 'native':
+        return whisper_wrapper.Whisper(model_path, n_threads=n_threads)
+    if kind == 'server':
+        return PersistentWhisper(model_path, server_path=exe_path, n_threads=n_threads)
+    if kind == 'subprocess':
+        return SubprocessWhisper(model_path, exe_path=exe_path, n_threads=n_threads, confidence=confidence)
+    if kind == 'stub':
+        return whisper_wrapper.DummyWhisper(model_path)
+    if kind != 'auto':
+        raise ValueError(f"Unknown backend: {kind}")
+
+    # In-process binding: no process spawn, file I/O or output parsing
+    available, reason = whisper_wrapper.probe()
+    if available:
+        try:
+            return whisper_wrapper.Whisper(model_path, n_threads=n_threads)
+        except Exception as e:
+            print(f"In-process whisper failed to load ({e})")
+    else:
+        print(f"In-process whisper unavailable ({reason})")
+    # An explicit executable is used by whichever backend runs that kind of binary;
+    # a CLI binary skips the server so a default server can't take its place
+    server_path = exe_path if exe_path and is_server_executable(exe_path) else None
+    if exe_path is None or server_path:
+        try:
+            # Prefer a long-lived server so the model stays loaded between dictations
+            return PersistentWhisper(model_path, server_path=server_path, n_threads=n_threads)
+        except Exception as e:
+            print(f"Persistent whisper server unavailable ({e}), spawning per utterance")
+    return SubprocessWhisper(model_path, exe_path=None if server_path else exe_path, n_threads=n_threads,
+                             confidence=confidence)
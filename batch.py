@@ -0,0 +1,266 @@
+"""Headless batch transcription of audio files.
+
+Transcribes every file matched by the inputs through a pool of worker
+processes, each with its own warm backend. Results are streamed chunk by chunk
+into per-file .txt/.srt/.jsonl outputs, and each finished file is recorded in a
+manifest so an interrupted run resumes where it stopped:
+
+    python batch.py recordings/ "archive/**/*.wav" -o transcripts --format txt,srt
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from audio_files import find_audio_files, load_audio, SAMPLE_RATE
+from backends import BACKEND_KINDS
+from longform import chunk_ranges, default_parallelism, _init_worker, _transcribe_chunk
+from segments import clean_segments, srt_cue
+
+OUTPUT_FORMATS = ('txt', 'srt', 'jsonl')
+MANIFEST_NAME = 'manifest.jsonl'
+
+
+class TranscriptWriter:
+    """Streams segments into partial output files and publishes them on commit"""
+    def __init__(self, base, formats):
+        self.paths = {fmt: f"{base}.{fmt}" for fmt in formats}
+        self._files = {fmt: open(path + '.part', 'w', encoding='utf-8')
+                       for fmt, path in self.paths.items()}
+        self._cues = 0
+
+    def write(self, segments):
+        """Append one chunk's segments to every output"""
+        for fmt, f in self._files.items():
+            if fmt == 'txt':
+                text = ' '.join(s.text.strip() for s in segments if s.text.strip())
+                if text:
+                    f.write(text + '\n')
+            elif fmt == 'srt':
+                for segment in segments:
+                    if segment.text.strip():
+                        self._cues += 1
+                        f.write(srt_cue(self._cues, segment))
+            else:
+                for s in segments:
+                    f.write(json.dumps({'start': round(s.start, 3), 'end': round(s.end, 3),
+                                        'text': s.text, 'confidence': s.confidence}) + '\n')
+            f.flush()
+
+    def commit(self):
+        """Close the partial files and move them into place"""
+        for fmt, f in self._files.items():
+            f.close()
+            os.replace(f.name, self.paths[fmt])
+        return list(self.paths.values())
+
+    def abort(self):
+        """Close and delete the partial files of a file that didn't finish"""
+        for f in self._files.values():
+            f.close()
+            try:
+                os.remove(f.name)
+            except OSError:
+                pass
+
+
+def _transcribe_file(path, base, formats, chunk_seconds, sample_rate):
+    """Transcribe one file in a pool worker, writing outputs as each chunk finishes"""
+    start = time.perf_counter()
+    audio = load_audio(path, sample_rate)
+    ranges = chunk_ranges(audio, sample_rate, chunk_seconds) if len(audio) else []
+
+    writer = TranscriptWriter(base, formats)
+    try:
+        n_segments = 0
+        for i, (chunk_start, chunk_end) in enumerate(ranges):
+            _, segments = _transcribe_chunk(i, chunk_start, audio[chunk_start:chunk_end], sample_rate)
+            writer.write(clean_segments(segments))
+            n_segments += len(segments)
+        outputs = writer.commit()
+    except BaseException:
+        writer.abort()
+        raise
+
+    return {
+        'audio_seconds': len(audio) / sample_rate,
+        'seconds': time.perf_counter() - start,
+        'chunks': len(ranges),
+        'segments': n_segments,
+        'outputs': outputs,
+    }
+
+
+def file_signature(path):
+    """Identity of a file's contents for resuming: absolute path, size and mtime"""
+    st = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def output_names(paths):
+    """Map each input to an output base name, disambiguating repeated file names"""
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    counts = {}
+    for stem in stems:
+        counts[stem] = counts.get(stem, 0) + 1
+    names = {}
+    for path, stem in zip(paths, stems):
+        if counts[stem] > 1:
+            digest = hashlib.blake2b(os.path.abspath(path).encode('utf-8'), digest_size=4).hexdigest()
+            stem = f"{stem}-{digest}"
+        names[path] = stem
+    return names
+
+
+class Manifest:
+    """Append-only JSONL record of completed files in an output folder"""
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by an interrupted run
+                        continue
+                    self.done[entry['path']] = entry
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def is_done(self, signature):
+        entry = self.done.get(signature['path'])
+        return (entry is not None and entry['size'] == signature['size']
+                and entry['mtime_ns'] == signature['mtime_ns'])
+
+    def add(self, entry):
+        """Record a finished file durably before moving on"""
+        self.done[entry['path']] = entry
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def run_batch(paths, output_dir, formats, model_path, kind='auto', exe_path=None,
+              workers=None, threads=None, chunk_seconds=30.0, force=False, cache_path=None):
+    """Transcribe paths into output_dir, skipping files already in the manifest"""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = Manifest(os.path.join(output_dir, MANIFEST_NAME))
+    names = output_names(paths)
+
+    pending = []
+    for path in paths:
+        signature = file_signature(path)
+        if force or not manifest.is_done(signature):
+            pending.append((path, signature))
+    skipped = len(paths) - len(pending)
+    if skipped:
+        print(f"Skipping {skipped} files already in {MANIFEST_NAME}")
+
+    default_workers, default_threads = default_parallelism()
+    workers = min(workers or default_workers, max(1, len(pending)))
+    if threads is None:
+        threads = default_threads if workers == default_workers else max(1, (os.cpu_count() or 1) // workers)
+    print(f"Transcribing {len(pending)} files with {workers} workers x {threads} threads")
+
+    totals = {'files': 0, 'failed': 0, 'skipped': skipped, 'audio_seconds': 0.0}
+    wall_start = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               # Only the JSONL output records segment confidences
+                               initargs=(model_path, kind, threads, exe_path, cache_path, True,
+                                         'jsonl' in formats))
+    try:
+        futures = {
+            pool.submit(_transcribe_file, path, os.path.join(output_dir, names[path]),
+                        formats, chunk_seconds, SAMPLE_RATE): (path, signature)
+            for path, signature in pending
+        }
+        for n, future in enumerate(as_completed(futures), 1):
+            path, signature = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                totals['failed'] += 1
+                print(f"[{n}/{len(pending)}] {path}: failed ({e})")
+                continue
+
+            manifest.add({**signature, **result, 'time': time.time()})
+            totals['files'] += 1
+            totals['audio_seconds'] += result['audio_seconds']
+            speed = result['audio_seconds'] / result['seconds'] if result['seconds'] else 0
+            print(f"[{n}/{len(pending)}] {path}: {result['audio_seconds']:.0f}s audio "
+                  f"in {result['seconds']:.1f}s ({speed:.1f}x)")
+    except KeyboardInterrupt:
+        print("Interrupted - finished files are in the manifest, rerun to resume")
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        pool.shutdown()
+        manifest.close()
+
+    totals['wall_seconds'] = time.perf_counter() - wall_start
+    # Audio-hours per wall-hour is the same ratio as audio-seconds per wall-second
+    totals['audio_hours_per_hour'] = (totals['audio_seconds'] / totals['wall_seconds']
+                                      if totals['wall_seconds'] else None)
+    return totals
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe a folder or glob of audio files")
+    parser.add_argument('inputs', nargs='+', help="audio files, directories or globs")
+    parser.add_argument('-o', '--output-dir', default='transcripts')
+    parser.add_argument('--format', default='txt',
+                        type=lambda v: [fmt for fmt in v.split(',') if fmt],
+                        help=f"comma-separated output formats from {', '.join(OUTPUT_FORMATS)}")
+    parser.add_argument('--backend', choices=BACKEND_KINDS, default='auto')
+    parser.add_argument('--exe', help="whisper.cpp (or stub) executable for the backend")
+    parser.add_argument('--model', default=os.path.join('whisper.cpp', 'models', 'ggml-base.en.bin'))
+    parser.add_argument('--workers', type=int, help="worker processes (default from cpu count)")
+    parser.add_argument('--threads', type=int, help="whisper threads per worker")
+    parser.add_argument('--chunk-seconds', type=float, default=30.0)
+    parser.add_argument('--force', action='store_true', help="redo files already in the manifest")
+    parser.add_argument('--cache', default=None, metavar='PATH',
+                        help="transcript cache file (default: per-user cache folder)")
+    parser.add_argument('--no-cache', action='store_true', help="always run inference")
+    args = parser.parse_args(argv)
+    unknown = set(args.format) - set(OUTPUT_FORMATS)
+    if unknown:
+        parser.error(f"unknown format: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = find_audio_files(args.inputs)
+    if not paths:
+        print("No audio files found")
+        return 1
+
+    cache_path = None
+    if not args.no_cache:
+        from transcript_cache import default_cache_path
+        cache_path = args.cache or default_cache_path()
+
+    try:
+        totals = run_batch(paths, args.output_dir, args.format, args.model, kind=args.backend,
+                           exe_path=args.exe, workers=args.workers, threads=args.threads,
+                           chunk_seconds=args.chunk_seconds, force=args.force,
+                           cache_path=cache_path)
+    except KeyboardInterrupt:
+        return 130
+
+    hours = totals['audio_seconds'] / 3600
+    print(f"\n{totals['files']} files done, {totals['skipped']} skipped, {totals['failed']} failed")
+    print(f"{hours:.2f} audio hours in {totals['wall_seconds'] / 3600:.2f} wall hours")
+    if totals['audio_hours_per_hour'] is not None:
+        print(f"Throughput: {totals['audio_hours_per_hour']:.1f} audio-hours per wall-hour")
+    return 1 if totals['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,373 @@
+"""Headless benchmark for the transcription pipeline.
+
+Feeds WAV/NPY clips (or synthetic audio) through the same TranscriptionPipeline
+that WhisperApp uses and reports real-time factor, per-stage latency, peak RSS
+and throughput. Works with a stub recognizer binary on a CPU-only box:
+
+    python bench.py --exe ./stub-main --model models/ggml-base.en.bin --synthetic 5,30 -o run.json
+
+--resampler instead checks the capture resampler on synthetic tones: speed,
+accuracy against an ideal 16 kHz signal, alias rejection, and that block-by-block
+processing matches a single call, and exits non-zero if any rate misses
+RESAMPLER_LIMITS. --postprocess times the text rules per transcription against
+a per-rule re.sub loop, for rule sets of growing size.
+"""
+import argparse
+import collections
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+from audio_files import load_audio, find_audio_files, synthetic_speech, SAMPLE_RATE
+from pipeline import TranscriptionPipeline
+from tracing import Trace
+from backends import BACKEND_KINDS
+
+
+def create_backend(args, cache=None):
+    """Build the backend selected on the command line"""
+    from backends import create_backend as create
+    return create(args.model, kind=args.backend, n_threads=args.threads, exe_path=args.exe, cache=cache)
+
+
+def collect_clips(args):
+    """Return (name, audio) pairs from the input paths and synthetic durations"""
+    clips = [(os.path.basename(path), load_audio(path)) for path in find_audio_files(args.inputs)]
+
+    for i, seconds in enumerate(args.synthetic):
+        clips.append((f"synthetic-{seconds:g}s", synthetic_speech(seconds, seed=i)))
+    return clips
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and its children, in MB"""
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return own, children
+
+
+def git_commit():
+    """Current commit of the working tree, so runs can be compared"""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def summarize(values):
+    """Mean/p50/p95/max of a list of milliseconds"""
+    return {
+        'mean': float(np.mean(values)),
+        'p50': float(np.percentile(values, 50)),
+        'p95': float(np.percentile(values, 95)),
+        'max': float(np.max(values)),
+    }
+
+
+def run_benchmark(pipeline, clips, repeat=1, warmup=1):
+    """Run every clip through the pipeline and collect timings"""
+    for _, audio in clips[:warmup]:
+        pipeline.run(audio)
+
+    results = []
+    stage_ms = collections.defaultdict(list)
+    wall_start = time.perf_counter()
+    for _ in range(repeat):
+        for name, audio in clips:
+            trace = Trace('bench')
+            start = time.perf_counter()
+            with trace.activate():
+                text = pipeline.run(audio)
+            elapsed = time.perf_counter() - start
+
+            data = trace.to_dict()
+            duration = len(audio) / SAMPLE_RATE
+            for item in data['spans']:
+                stage_ms[item['name']].append(item['ms'])
+            stage_ms['total'].append(elapsed * 1000)
+            results.append({
+                'clip': name,
+                'audio_seconds': duration,
+                'seconds': elapsed,
+                'rtf': elapsed / duration if duration else None,
+                'text': text,
+                'spans': data['spans'],
+            })
+    wall = time.perf_counter() - wall_start
+
+    audio_seconds = sum(r['audio_seconds'] for r in results)
+    busy_seconds = sum(r['seconds'] for r in results)
+    own_rss, child_rss = peak_rss_mb()
+    summary = {
+        'clips': len(results),
+        'audio_seconds': audio_seconds,
+        'wall_seconds': wall,
+        'rtf': busy_seconds / audio_seconds if audio_seconds else None,
+        'throughput_audio_seconds_per_second': audio_seconds / wall if wall else None,
+        'clips_per_second': len(results) / wall if wall else None,
+        'peak_rss_mb': own_rss,
+        'peak_child_rss_mb': child_rss,
+        'stages_ms': {name: summarize(values) for name, values in stage_ms.items()},
+    }
+    return summary, results
+
+
+def run_resampler_benchmark(rates=(8000, 22050, 32000, 44100, 48000), seconds=10.0, block=1024):
+    """Measure PolyphaseResampler throughput and accuracy for common device rates"""
+    from resample import PolyphaseResampler, resample_audio
+    tones = ((0.5, 440.0), (0.3, 3100.0))
+    results = []
+    for rate in rates:
+        t = np.arange(int(seconds * rate)) / rate
+        audio = sum(a * np.sin(2 * np.pi * f * t) for a, f in tones).astype(np.float32)
+        # A tone above 8 kHz must not fold back into the speech band
+        alias = (0.5 * np.sin(2 * np.pi * 10000 * t)).astype(np.float32)
+
+        resampler = PolyphaseResampler(rate)
+        start = time.perf_counter()
+        parts = [resampler.process(audio[i:i + block]).copy() for i in range(0, len(audio), block)]
+        elapsed = time.perf_counter() - start
+        blocked = np.concatenate(parts + [resampler.flush()])
+        whole = resample_audio(audio, rate)
+
+        t_out = np.arange(len(whole)) / SAMPLE_RATE
+        ideal = sum(a * np.sin(2 * np.pi * f * t_out) for a, f in tones)
+        # Skip the edges, where the filter sees the implicit silence around the clip
+        edge = slice(256, -256)
+        error = whole[edge] - ideal[edge]
+        snr = 10 * np.log10(np.sum(ideal[edge] ** 2) / np.sum(error ** 2))
+        rejection = None
+        if rate > 2 * 10000:
+            leaked = resample_audio(alias, rate)[edge]
+            rejection = float(10 * np.log10(0.125 / max(np.mean(leaked ** 2), 1e-20)))
+
+        results.append({
+            'rate': rate,
+            'realtime_factor': seconds / elapsed,
+            'samples_per_second': len(audio) / elapsed,
+            'snr_db': float(snr),
+            'alias_rejection_db': rejection,
+            'length_ok': len(whole) == round(len(audio) * SAMPLE_RATE / rate),
+            'blocked_max_diff': float(np.max(np.abs(blocked - whole))),
+        })
+    return results
+
+
+# Pass marks for --resampler: minimum SNR and alias rejection in dB, and the
+# largest allowed difference between block-by-block and one-call output
+RESAMPLER_LIMITS = {'snr_db': 40.0, 'alias_rejection_db': 70.0, 'blocked_max_diff': 1e-5}
+
+
+def check_resampler_results(results, limits=RESAMPLER_LIMITS):
+    """Return a description of every result that misses the limits"""
+    failures = []
+    for r in results:
+        if not r['length_ok']:
+            failures.append(f"{r['rate']} Hz: wrong output length")
+        if r['snr_db'] < limits['snr_db']:
+            failures.append(f"{r['rate']} Hz: SNR {r['snr_db']:.1f} dB < {limits['snr_db']} dB")
+        if r['alias_rejection_db'] is not None and r['alias_rejection_db'] < limits['alias_rejection_db']:
+            failures.append(f"{r['rate']} Hz: alias rejection {r['alias_rejection_db']:.1f} dB "
+                            f"< {limits['alias_rejection_db']} dB")
+        if r['blocked_max_diff'] > limits['blocked_max_diff']:
+            failures.append(f"{r['rate']} Hz: blocked output differs by {r['blocked_max_diff']:.2e}")
+    return failures
+
+
+def print_resampler_results(results):
+    print(f"{'rate':>8}{'x realtime':>12}{'SNR dB':>9}{'alias dB':>10}{'length':>8}{'block diff':>12}")
+    for r in results:
+        rejection = f"{r['alias_rejection_db']:.1f}" if r['alias_rejection_db'] is not None else '-'
+        print(f"{r['rate']:>8}{r['realtime_factor']:>12.0f}{r['snr_db']:>9.1f}{rejection:>10}"
+              f"{'ok' if r['length_ok'] else 'WRONG':>8}{r['blocked_max_diff']:>12.2e}")
+
+
+def run_postprocess_benchmark(sizes=(0, 100, 1000, 10000), calls=2000, naive_limit=1000):
+    """Measure per-call cost of the compiled text rules for growing vocabularies"""
+    import re
+    from postprocess import PostProcessor, DEFAULT_RULES
+    text = ("Um, so I think we should move the service to kubernetes comma then update "
+            "the Jason schema full stop new line after that, uh, we can ship the release")
+    results = []
+    for size in sizes:
+        vocabulary = ''.join(f"term{i} word{i % 97} => Term{i}\n" for i in range(size))
+        rules_text = (DEFAULT_RULES + "\n[commands]\ncomma => ,\nfull stop => .\nnew line => \\n\n"
+                      "[vocabulary]\nkubernetes => Kubernetes\njason => JSON\n" + vocabulary)
+        start = time.perf_counter()
+        processor = PostProcessor(rules_text=rules_text)
+        compile_ms = (time.perf_counter() - start) * 1000
+        rules = processor.rules
+
+        start = time.perf_counter()
+        for _ in range(calls):
+            processor.process(text)
+        per_call = (time.perf_counter() - start) / calls
+
+        # Incremental use: the same text arriving as partial results of a few words
+        words = text.split()
+        pieces = [' '.join(words[i:i + 4]) for i in range(0, len(words), 4)]
+        start = time.perf_counter()
+        for _ in range(calls // 10):
+            stream = processor.stream()
+            for piece in pieces:
+                stream.feed(piece)
+            stream.finish()
+        per_stream = (time.perf_counter() - start) / (calls // 10)
+
+        naive = None
+        if size <= naive_limit:
+            # What the rules would cost as one precompiled re.sub per entry
+            patterns = [(re.compile(r"(?<![\w'])" + re.escape(key).replace(r'\ ', r'[\s,]+') + r"(?![\w'])",
+                                    re.IGNORECASE), written) for key, (_, written) in rules.rules.items()]
+            start = time.perf_counter()
+            for _ in range(calls // 10):
+                out = text
+                for pattern, written in patterns:
+                    out = pattern.sub(lambda m, w=written: w, out)
+            naive = (time.perf_counter() - start) / (calls // 10)
+
+        results.append({
+            'rules': len(rules.rules),
+            'compile_ms': compile_ms,
+            'per_call_us': per_call * 1e6,
+            'per_stream_us': per_stream * 1e6,
+            'naive_per_call_us': naive * 1e6 if naive is not None else None,
+            'output': processor.process(text),
+        })
+    return results
+
+
+def print_postprocess_results(results):
+    print(f"{'rules':>8}{'compile ms':>12}{'call us':>10}{'stream us':>11}{'naive us':>11}")
+    for r in results:
+        naive = f"{r['naive_per_call_us']:.0f}" if r['naive_per_call_us'] is not None else '-'
+        print(f"{r['rules']:>8}{r['compile_ms']:>12.1f}{r['per_call_us']:>10.1f}"
+              f"{r['per_stream_us']:>11.1f}{naive:>11}")
+    print(f"Output: {results[-1]['output']!r}")
+
+
+def print_summary(summary):
+    """Print a human-readable version of the summary"""
+    print(f"\n{summary['clips']} clips, {summary['audio_seconds']:.1f}s audio in {summary['wall_seconds']:.2f}s")
+    if summary['rtf'] is not None:
+        print(f"Real-time factor: {summary['rtf']:.3f}  "
+              f"throughput: {summary['throughput_audio_seconds_per_second']:.1f} audio s/s")
+    if summary['peak_rss_mb'] is not None:
+        print(f"Peak RSS: {summary['peak_rss_mb']:.1f} MB (children {summary['peak_child_rss_mb']:.1f} MB)")
+    if 'cache' in summary:
+        cache = summary['cache']
+        print(f"Cache: {cache['hits']} hits ({cache['disk_hits']} from disk), {cache['misses']} misses")
+    print(f"{'stage':<20}{'mean':>10}{'p50':>10}{'p95':>10}{'max':>10}  (ms)")
+    for name, s in sorted(summary['stages_ms'].items(), key=lambda item: item[0] == 'total'):
+        print(f"{name:<20}{s['mean']:>10.1f}{s['p50']:>10.1f}{s['p95']:>10.1f}{s['max']:>10.1f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the whisper transcription pipeline")
+    parser.add_argument('inputs', nargs='*', help="audio files, directories or globs")
+    parser.add_argument('--synthetic', type=lambda v: [float(x) for x in v.split(',') if x],
+                        default=[], help="comma-separated durations of synthetic clips, in seconds")
+    parser.add_argument('--backend', choices=BACKEND_KINDS, default='subprocess')
+    parser.add_argument('--exe', help="whisper.cpp (or stub) executable for the backend")
+    parser.add_argument('--model', default=os.path.join('whisper.cpp', 'models', 'ggml-base.en.bin'))
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--longform', type=float, metavar='SECONDS',
+                        help="chunk clips at least this long across a process pool")
+    parser.add_argument('--workers', type=int, help="long-form worker processes (default from cpu count)")
+    # Off by default: cached clips would measure the cache rather than inference
+    parser.add_argument('--cache', nargs='?', const='', default=None, metavar='PATH',
+                        help="answer repeated clips from the transcript cache (optionally at PATH)")
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--warmup', type=int, default=1, help="clips to run before timing")
+    parser.add_argument('--resampler', action='store_true',
+                        help="benchmark the capture resampler on synthetic signals instead")
+    parser.add_argument('--postprocess', action='store_true',
+                        help="benchmark the text rules per transcription instead")
+    parser.add_argument('-o', '--output', help="write results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.resampler:
+        results = run_resampler_benchmark()
+        print_resampler_results(results)
+        failures = check_resampler_results(results)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump({'commit': git_commit(), 'time': time.time(), 'resampler': results,
+                           'failures': failures}, f, indent=2)
+        for failure in failures:
+            print(f"FAIL {failure}")
+        return 1 if failures else 0
+    if args.postprocess:
+        results = run_postprocess_benchmark()
+        print_postprocess_results(results)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump({'commit': git_commit(), 'time': time.time(), 'postprocess': results}, f, indent=2)
+        return 0
+
+    clips = collect_clips(args)
+    if not clips:
+        print("No clips to benchmark - pass audio files or --synthetic")
+        return 1
+
+    cache = None
+    if args.cache is not None:
+        from transcript_cache import TranscriptCache
+        cache = TranscriptCache(args.cache or None)
+    backend = create_backend(args, cache)
+    longform = None
+    if args.longform is not None:
+        from longform import LongFormTranscriber
+        longform = LongFormTranscriber(args.model, kind=args.backend, exe_path=args.exe,
+                                       workers=args.workers, cache_path=cache.path if cache else None)
+    pipeline = TranscriptionPipeline(backend, longform=longform,
+                                     longform_seconds=args.longform or 0)
+    try:
+        summary, results = run_benchmark(pipeline, clips,
+                                         repeat=args.repeat, warmup=args.warmup)
+    finally:
+        if hasattr(backend, 'close'):
+            backend.close()
+
+    if cache is not None:
+        summary['cache'] = cache.stats()
+    print_summary(summary)
+    if args.output:
+        report = {
+            'commit': git_commit(),
+            'time': time.time(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'params': {
+                'backend': args.backend,
+                'exe': args.exe,
+                'model': args.model,
+                'threads': args.threads,
+                'longform': args.longform,
+                'workers': longform.workers if longform else None,
+                'repeat': args.repeat,
+            },
+            'summary': summary,
+            'results': results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
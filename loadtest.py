@@ -0,0 +1,135 @@
+"""Load test for the local transcription service.
+
+Runs concurrent clients against a running service.py (or the app's Local API
+Server) and reports latency percentiles, requests per second, audio seconds
+transcribed per second and how many requests were turned away with 503:
+
+    python loadtest.py --url http://127.0.0.1:8765 --clients 8 --requests 50 --seconds 5
+    python loadtest.py --stream --seconds 60 --realtime
+"""
+import argparse
+import asyncio
+import collections
+import json
+import sys
+import time
+import urllib.parse
+import numpy as np
+from audio_files import synthetic_speech, SAMPLE_RATE
+
+
+async def _request(url, path, body, stream=False, realtime=False, piece_bytes=32000):
+    """Send one request; returns (status, response body)"""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme == 'unix':
+        reader, writer = await asyncio.open_unix_connection(parts.path)
+    else:
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    try:
+        head = f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/octet-stream\r\n"
+        if stream:
+            writer.write((head + "Transfer-Encoding: chunked\r\n\r\n").encode('latin-1'))
+            # s16le mono: two bytes per sample
+            pace = piece_bytes / (2 * SAMPLE_RATE) if realtime else 0
+            for i in range(0, len(body), piece_bytes):
+                piece = body[i:i + piece_bytes]
+                writer.write(f"{len(piece):x}\r\n".encode('latin-1') + piece + b'\r\n')
+                await writer.drain()
+                if pace:
+                    await asyncio.sleep(pace)
+            writer.write(b'0\r\n\r\n')
+        else:
+            writer.write((head + f"Content-Length: {len(body)}\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+        response = await reader.read()
+    except ConnectionError:
+        # The server may answer 503 and close before the upload is finished
+        response = await reader.read()
+    finally:
+        writer.close()
+    status_line, _, rest = response.partition(b'\r\n')
+    status = int(status_line.split()[1]) if status_line else 0
+    return status, rest.partition(b'\r\n\r\n')[2]
+
+
+async def _client(args, path, body, audio_seconds, results):
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        try:
+            status, _ = await _request(args.url, path, body, args.stream, args.realtime)
+        except OSError as e:
+            print(f"Request failed: {e}")
+            status = 0
+        elapsed = time.perf_counter() - start
+        results['status'][status] += 1
+        if status == 200:
+            results['latencies'].append(elapsed)
+            results['audio_seconds'] += audio_seconds
+        elif status == 503:
+            await asyncio.sleep(args.backoff)
+
+
+async def run_load(args):
+    audio = synthetic_speech(args.seconds)
+    body = (np.clip(audio, -1, 1) * 32767).astype('<i2').tobytes()
+    path = ('/stream' if args.stream else '/transcribe') + (f"?priority={args.priority}" if args.priority else '')
+    results = {'status': collections.Counter(), 'latencies': [], 'audio_seconds': 0.0}
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(args, path, body, args.seconds, results) for _ in range(args.clients)))
+    results['wall_seconds'] = time.perf_counter() - start
+    return results
+
+
+def summarize(results):
+    latencies = np.array(results['latencies'])
+    wall = results['wall_seconds']
+    summary = {
+        'ok': len(latencies),
+        'rejected_503': results['status'][503],
+        'errors': sum(n for status, n in results['status'].items() if status not in (200, 503)),
+        'wall_seconds': wall,
+        'requests_per_second': len(latencies) / wall if wall else 0,
+        'audio_seconds_per_second': results['audio_seconds'] / wall if wall else 0,
+    }
+    for p in (50, 95, 99):
+        summary[f"latency_p{p}_ms"] = float(np.percentile(latencies, p)) * 1000 if len(latencies) else None
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the local transcription service")
+    parser.add_argument('--url', default='http://127.0.0.1:8765',
+                        help="service address, or unix:///path/to/socket")
+    parser.add_argument('--clients', type=int, default=4, help="concurrent clients")
+    parser.add_argument('--requests', type=int, default=10, help="requests per client")
+    parser.add_argument('--seconds', type=float, default=5.0, help="synthetic audio per request")
+    parser.add_argument('--stream', action='store_true', help="upload to /stream in chunks")
+    parser.add_argument('--realtime', action='store_true', help="pace streamed uploads at real time")
+    parser.add_argument('--priority', choices=('api', 'batch'), help="priority query parameter")
+    parser.add_argument('--backoff', type=float, default=0.5, help="seconds to wait after a 503")
+    parser.add_argument('-o', '--output', help="write the summary as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    summary = summarize(asyncio.run(run_load(args)))
+
+    def ms(value):
+        return f"{value:.0f} ms" if value is not None else "-"
+
+    print(f"{summary['ok']} ok, {summary['rejected_503']} rejected (503), {summary['errors']} errors "
+          f"in {summary['wall_seconds']:.1f}s")
+    print(f"Latency p50 {ms(summary['latency_p50_ms'])}, p95 {ms(summary['latency_p95_ms'])}, "
+          f"p99 {ms(summary['latency_p99_ms'])}")
+    print(f"{summary['requests_per_second']:.2f} req/s, "
+          f"{summary['audio_seconds_per_second']:.1f} audio seconds per second")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
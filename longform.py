@@ -0,0 +1,172 @@
+import math
+import multiprocessing.util
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from segments import Segment, clean_segments, join_segments
+from vad import split_on_pauses
+from scheduler import INTERACTIVE
+
+# Backend and cache owned by each pool worker process, created once by _init_worker
+_worker_backend = None
+_worker_cache = None
+
+
+def default_parallelism(cpu_count=None):
+    """Return (workers, threads_per_worker) for this machine"""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    # whisper.cpp scales well to about four threads per inference, so spread
+    # the rest of the cores across independent chunks
+    threads = min(4, cpu_count)
+    workers = max(1, cpu_count // threads)
+    return workers, max(1, cpu_count // workers)
+
+
+def chunk_ranges(audio, sample_rate=16000, chunk_seconds=30.0):
+    """Pause-aligned (start, end) sample ranges of roughly chunk_seconds each"""
+    return split_on_pauses(audio, sample_rate, target_seconds=chunk_seconds,
+                           min_seconds=chunk_seconds / 3, max_seconds=chunk_seconds * 1.5)
+
+
+def iter_chunks(audio, sample_rate=16000, chunk_seconds=30.0):
+    """Yield (offset, samples) pause-aligned chunks, reading at most two chunks at a time
+
+    audio is an array or anything with len() and read(start, end), such as a
+    SpilledAudio, so a recording never has to be in memory all at once.
+    """
+    read = getattr(audio, 'read', None) or (lambda start, end: audio[start:end])
+    total = len(audio)
+    # Longer than the longest chunk, so chunk_ranges always has a cut to make
+    span = int(chunk_seconds * 2 * sample_rate)
+    position = 0
+    while position < total:
+        window = read(position, min(total, position + span))
+        if position + len(window) >= total:
+            yield position, window
+            return
+        # Cut at the pause nearest the target length, as chunk_ranges does
+        cut = chunk_ranges(window, sample_rate, chunk_seconds)[0][1]
+        yield position, window[:cut]
+        position += cut
+
+
+def _init_worker(model_path, kind, n_threads, exe_path, cache_path=None, cache_enabled=True,
+                 confidence=False):
+    """Load the model once per pool process"""
+    global _worker_backend, _worker_cache
+    from backends import create_backend
+    if cache_path:
+        from transcript_cache import TranscriptCache
+        _worker_cache = TranscriptCache(cache_path, enabled=cache_enabled)
+    _worker_backend = create_backend(model_path, kind=kind, n_threads=n_threads,
+                                     exe_path=exe_path, cache=_worker_cache, confidence=confidence)
+    # Pool workers leave through os._exit, so __del__ never runs; finalizers
+    # registered with an exit priority still do, stopping servers and temp dirs
+    multiprocessing.util.Finalize(None, _close_worker, exitpriority=10)
+
+
+def _close_worker():
+    """Release the worker's backend and cache as the pool process exits"""
+    global _worker_backend, _worker_cache
+    if _worker_backend is not None:
+        _worker_backend.close()
+        _worker_backend = None
+    if _worker_cache is not None:
+        _worker_cache.close()
+        _worker_cache = None
+
+
+def _run_in_pool(pool, *args):
+    """Scheduler job that runs one chunk in the pool and waits for it"""
+    return pool.submit(_transcribe_chunk, *args).result()
+
+
+def _transcribe_chunk(index, offset, audio, sample_rate):
+    """Transcribe one chunk in a worker and re-base its segments to the full recording"""
+    backend = _worker_backend
+    if hasattr(backend, 'transcribe_segments'):
+        segments = backend.transcribe_segments(audio)
+    else:
+        # Backends without timestamps report the chunk as one segment
+        segments = [Segment(0.0, len(audio) / sample_rate, backend.transcribe(audio))]
+
+    start = offset / sample_rate
+    return index, [Segment(s.start + start, s.end + start, s.text, s.confidence) for s in segments]
+
+
+class LongFormResult:
+    """Stitched transcription of a long recording"""
+    def __init__(self, segments, chunks, seconds):
+        self.segments = segments
+        self.chunks = chunks
+        self.seconds = seconds
+
+    @property
+    def text(self):
+        return join_segments(clean_segments(self.segments))
+
+
+class LongFormTranscriber:
+    """Transcribes long recordings as pause-aligned chunks across a process pool
+
+    With a Scheduler, each chunk is a job costing one worker's threads, so
+    long-form work stays inside the cores shared with other inference.
+    """
+    def __init__(self, model_path, kind='auto', exe_path=None, workers=None,
+                 threads_per_worker=None, chunk_seconds=30.0, sample_rate=16000, cache_path=None,
+                 cache_enabled=True, scheduler=None, priority=INTERACTIVE):
+        self.model_path = model_path
+        # Workers share the on-disk transcript cache when a path is given; the
+        # enabled flag is read each time a pool starts, so it can be switched
+        self.cache_path = cache_path
+        self.cache_enabled = cache_enabled
+        self.kind = kind
+        self.exe_path = exe_path
+        default_workers, default_threads = default_parallelism()
+        self.workers = workers or default_workers
+        if threads_per_worker is None:
+            # Size threads so all workers together use every core once
+            threads_per_worker = default_threads if workers is None else max(1, (os.cpu_count() or 1) // workers)
+        self.threads_per_worker = threads_per_worker
+        self.chunk_seconds = chunk_seconds
+        self.sample_rate = sample_rate
+        self.scheduler = scheduler
+        self.priority = priority
+
+    def transcribe(self, audio):
+        """Transcribe audio of any length and return a LongFormResult"""
+        start = time.perf_counter()
+        expected = max(1, math.ceil(len(audio) / (self.chunk_seconds * self.sample_rate)))
+        workers = min(self.workers, expected)
+        print(f"Long-form: {len(audio) / self.sample_rate:.0f}s in about {expected} chunks, "
+              f"{workers} workers x {self.threads_per_worker} threads")
+
+        results = []
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.model_path, self.kind, self.threads_per_worker, self.exe_path,
+                      self.cache_path, self.cache_enabled),
+        ) as pool:
+            # Keep only a couple of chunks per worker in flight so a recording
+            # read from disk is never held in memory all at once
+            pending = set()
+            for i, (offset, chunk) in enumerate(iter_chunks(audio, self.sample_rate, self.chunk_seconds)):
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    results.extend(future.result() for future in done)
+                if self.scheduler is None:
+                    pending.add(pool.submit(_transcribe_chunk, i, offset, chunk, self.sample_rate))
+                else:
+                    pending.add(self.scheduler.submit(_run_in_pool, pool, i, offset, chunk, self.sample_rate,
+                                                      priority=self.priority, cost=self.threads_per_worker))
+            results.extend(future.result() for future in pending)
+
+        # Chunks come back in any order; stitch them in recording order
+        results.sort(key=lambda item: item[0])
+        segments = [segment for _, chunk in results for segment in chunk]
+        return LongFormResult(segments, len(results), time.perf_counter() - start)
+
+    def transcribe_text(self, audio):
+        """Same as transcribe(), returning only the stitched text"""
+        return self.transcribe(audio).text
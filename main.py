@@ -1,56 +1,218 @@
+import time
+# Measured from here so startup time covers imports too
+STARTUP_START = time.perf_counter()
+
 import sys
 import os
-from PySide6.QtWidgets import QApplication, QSystemTrayIcon, QMenu
-from PySide6.QtGui import QIcon, QAction
-from PySide6.QtCore import QThread, Signal
+from PySide6.QtWidgets import QApplication, QSystemTrayIcon, QMenu, QMessageBox
+from PySide6.QtGui import QIcon, QAction, QActionGroup, QDesktopServices
+from PySide6.QtCore import QThread, Signal, QObject, Qt
 from pynput import keyboard
-import numpy as np
-import sounddevice as sd
-import pyautogui
-import time
 import traceback
-from subprocess_whisper import SubprocessWhisper
+import threading
+import multiprocessing
 from util import get_resource_path
-from PySide6.QtCore import QCoreApplication, QTimer
-from ctypes import windll
+from transcription_worker import TranscriptionWorker
+from text_output import TextInserter
+from tracing import Trace, TraceLog
+from PySide6.QtCore import QCoreApplication, QTimer, QStandardPaths, QSettings, QUrl
+# NumPy, sounddevice and the whisper backends are imported on first use so
+# the tray icon appears before they load
+
+if sys.platform == 'win32':
+    from ctypes import windll
+    windll.shell32.SetCurrentProcessExplicitAppUserModelID(QCoreApplication.applicationName())
 
-windll.shell32.SetCurrentProcessExplicitAppUserModelID(QCoreApplication.applicationName())
+IMPORTS_DONE = time.perf_counter()
 
 class AudioRecorder(QThread):
-    """Thread for recording audio without blocking the main application"""
-    finished = Signal(np.ndarray)
+    """Thread for recording audio without blocking the main application
+
+    With preroll_seconds set the recorder is "armed": the input stream stays
+    open between dictations and the last few hundred milliseconds are kept in a
+    ring, so begin_take() starts instantly and includes audio from just before
+    the hotkey. Without it, one recorder captures one recording and exits.
+    """
+    finished = Signal(object)  # np.ndarray of float32 samples
     
-    def __init__(self, sample_rate=16000):
+    def __init__(self, sample_rate=16000, on_data=None, device=None, blocksize=0, latency=None,
+                 preroll_seconds=0.0, spill_bytes=None):
         super().__init__()
         self.sample_rate = sample_rate  # 16kHz is good for speech recognition
-        self.recording = True
-        self.audio_data = []
+        # Input device (index or name; None for the system default) and stream settings
+        self.device = device
+        self.blocksize = blocksize
+        self.latency = latency
+        # Recordings holding more than this much float32 audio move to a file on disk
+        self.spill_bytes = spill_bytes
+        from audio_buffer import RingBuffer
+        self.preroll = RingBuffer(int(preroll_seconds * sample_rate)) if preroll_seconds > 0 else None
+        self.recording = self.preroll is None
+        self.closing = False
+        # Wakes the capture thread to stop or to grow the buffer
+        self._wake = threading.Event()
+        # Serializes the callback's writes with switching between pre-roll and a take
+        self._lock = threading.Lock()
+        self.buffer = self._new_buffer()
+        # Optional consumer notified whenever new samples land (streaming mode)
+        self.on_data = on_data
+        self.streamer = None
+        self.trace = None
         
     def run(self):
         """Record audio until stopped"""
+        import numpy as np
+        import sounddevice as sd
+        from resample import PolyphaseResampler, downmix
+
+        # Capture in the device's own format so the host doesn't have to
+        # convert (or refuse); downmix and resample to 16 kHz mono here
+        info = sd.query_devices(self.device, 'input')
+        rate = int(info['default_samplerate'])
+        channels = max(1, int(info['max_input_channels']))
+        resampler = PolyphaseResampler(rate, self.sample_rate) if rate != self.sample_rate else None
+        print(f"Recording from {info['name']}: {rate} Hz, {channels} channels")
+        mono = np.empty(max(self.blocksize, 4096), dtype=np.float32)
+
         def callback(indata, frames, time, status):
-            if self.recording:
-                self.audio_data.append(indata.copy())
-                
-        with sd.InputStream(samplerate=self.sample_rate, channels=1, callback=callback):
-            while self.recording:
-                self.msleep(10)  # Sleep to avoid high CPU usage
-                
-        # Process recorded audio
-        if self.audio_data:
-            audio = np.concatenate(self.audio_data, axis=0).flatten()
-            self.finished.emit(audio)
-            
+            nonlocal mono
+            if frames > len(mono):
+                mono = np.empty(frames, dtype=np.float32)
+            block = downmix(indata, mono)
+            if resampler is not None:
+                block = resampler.process(block)
+            with self._lock:
+                if self.recording:
+                    # Copy straight into the preallocated buffer - no per-block allocation
+                    self.buffer.write(block)
+                    on_data = self.on_data
+                elif self.preroll is not None:
+                    self.preroll.write(block)
+                    return
+                else:
+                    return
+            if on_data:
+                on_data()
+
+        with sd.InputStream(device=self.device, samplerate=rate, channels=channels,
+                            dtype='float32', blocksize=self.blocksize, latency=self.latency,
+                            callback=callback):
+            while True:
+                self._wake.wait()
+                self._wake.clear()
+                if self.closing:
+                    break
+                self.buffer.reserve()
+
+        if self.preroll is not None:
+            # Takes of an armed recorder are handed out by end_take()
+            return
+
+        if resampler is not None:
+            # Samples still inside the resampling filter
+            self.buffer.write(resampler.flush())
+
+        # Hand out a zero-copy view of the recorded audio; always emit so the
+        # app can release this thread even when nothing was captured
+        self.finished.emit(self.buffer.audio())
+
+    def _new_buffer(self):
+        """Buffer for one recording, spilling to disk past the threshold if one is set"""
+        from audio_buffer import AudioBuffer, SpillBuffer
+        if self.spill_bytes:
+            return SpillBuffer(self.spill_bytes, sample_rate=self.sample_rate,
+                               on_low_space=self._wake.set)
+        return AudioBuffer(sample_rate=self.sample_rate, on_low_space=self._wake.set)
+
+    def begin_take(self):
+        """Start a recording on an armed recorder, beginning with the pre-roll"""
+        buffer = self._new_buffer()
+        with self._lock:
+            buffer.write(self.preroll.read())
+            self.preroll.clear()
+            self.buffer = buffer
+            self.recording = True
+
+    def end_take(self):
+        """Finish the current take of an armed recorder and emit its audio"""
+        with self._lock:
+            self.recording = False
+            audio = self.buffer.audio()
+        self.finished.emit(audio)
+        # Ready for the next take
+        self.on_data = None
+        self.streamer = None
+        self.trace = None
+
     def stop(self):
-        """Stop recording"""
-        self.recording = False
+        """Stop recording and close the stream"""
+        with self._lock:
+            self.recording = False
+            self.closing = True
+        self._wake.set()
 
 # Set application identity - add this before creating WhisperApp
 QCoreApplication.setApplicationName("WhisperTranscriber")
 QCoreApplication.setOrganizationName("WhisperTranscriber")
 QCoreApplication.setApplicationVersion("1.0.0")
 
+class ClipboardBridge(QObject):
+    """Qt clipboard access for other threads; Qt only allows it on the GUI thread"""
+    _call = Signal(object)
+
+    def __init__(self):
+        super().__init__()
+        self._closed = False
+        # The calling thread waits for the GUI thread itself rather than through a
+        # blocking connection, so it can give up once the event loop is going away
+        self._call.connect(self._run, Qt.ConnectionType.QueuedConnection)
+
+    def get_text(self):
+        """Return the clipboard text, or None if it holds no text"""
+        def read():
+            data = QApplication.clipboard().mimeData()
+            return data.text() if data is not None and data.hasText() else None
+        return self._invoke(read)
+
+    def set_text(self, text):
+        self._invoke(lambda: QApplication.clipboard().setText(text))
+
+    def close(self):
+        """Refuse clipboard calls from other threads; the GUI thread won't run them"""
+        self._closed = True
+
+    def _invoke(self, fn):
+        if QThread.currentThread() == self.thread():
+            return fn()
+        if self._closed:
+            raise RuntimeError("Clipboard is unavailable while the app shuts down")
+        done = threading.Event()
+        result = []
+
+        def run():
+            try:
+                result.append(fn())
+            finally:
+                done.set()
+
+        self._call.emit(run)
+        while not done.wait(0.05):
+            if self._closed:
+                raise RuntimeError("Clipboard is unavailable while the app shuts down")
+        if not result:
+            raise RuntimeError("Clipboard access failed")
+        return result[0]
+
+    def _run(self, fn):
+        fn()
+
+
 class WhisperApp(QApplication):
+    # Emitted from the keyboard listener thread, handled on the Qt thread
+    hotkey_pressed = Signal()
+    # Emitted from the model loader thread when a model has been warmed up
+    model_warm = Signal(str)
+
     def __init__(self, argv):
         super().__init__(argv)
         # Prevent app from closing when all windows are closed
@@ -58,6 +220,9 @@ class WhisperApp(QApplication):
         
         # Initialize recorder
         self.recorder = None
+        self.stopping_recorders = []
+        # Recorder kept open between dictations when the microphone is armed
+        self.armed_recorder = None
         
         # Set up system tray icon
         self.tray_icon = QSystemTrayIcon(QIcon(get_resource_path("microphone.ico")))
@@ -65,33 +230,109 @@ class WhisperApp(QApplication):
         print(f"System tray available: {QSystemTrayIcon.isSystemTrayAvailable()}")
         print(f"Supports messages: {self.tray_icon.supportsMessages()}")
         print(f"Icon is null: {self.tray_icon.icon().isNull()}")
-        # Initialize whisper model
-        model_path = get_resource_path(os.path.join('whisper.cpp', 'models', 'ggml-base.en.bin'))
-        try:
-            self.whisper = SubprocessWhisper(model_path)
-            print(f"Whisper model loaded from {model_path}")
-        except Exception as e:
-            print(f"Error loading whisper model: {e}")
-            import traceback
-            traceback_str = traceback.format_exc()
-            print(f"Traceback: {traceback_str}")
-            self.whisper = None
+        # Models and the transcription worker are set up in finish_startup()
+        self.whisper = None
+        self.worker = None
+        self.transcript_cache = None
+        self.scheduler = None
+        self.service = None
+        self.longform = None
+        self.postprocess = None
+        self.pending_jobs = 0
+        self.starting = True
         
         self.tray_icon.setToolTip("Whisper Transcriber")   
 
+        # Inserts text once the hotkey modifiers are released; off Windows the
+        # clipboard strategy goes through Qt's clipboard on this thread
+        self.clipboard_bridge = ClipboardBridge()
+        self.text_inserter = TextInserter('clipboard', modifiers_released=lambda: not self.alt_pressed,
+                                          clipboard=(self.clipboard_bridge.get_text,
+                                                     self.clipboard_bridge.set_text))
+
+        # Per-stage timings of every dictation go to a rotating JSONL file
+        data_dir = QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
+        self.trace_log = TraceLog(os.path.join(data_dir, 'traces.jsonl'))
+        print(f"Writing latency traces to {self.trace_log.path}")
+
+        # Shut down the whisper server process with the app
+        self.aboutToQuit.connect(self.shutdown_whisper)
+        self.aboutToQuit.connect(self.disarm_microphone)
+
         # Create tray menu
         menu = QMenu()
         
         # Add a status action to the menu
-        self.status_action = QAction("Ready", self)
+        self.status_action = QAction("Starting...", self)
         self.status_action.setEnabled(False)  # Not clickable
         menu.addAction(self.status_action)
         
         menu.addSeparator()
+
+        # Transcribe overlapping windows in the background while recording
+        self.streaming_action = QAction("Streaming Transcription", self)
+        self.streaming_action.setCheckable(True)
+        menu.addAction(self.streaming_action)
+
+        # Answer repeated audio (e.g. a retried dictation) from the transcript cache
+        self.cache_action = QAction("Cache Transcriptions", self)
+        self.cache_action.setCheckable(True)
+        self.cache_action.setChecked(True)
+        self.cache_action.toggled.connect(self.set_cache_enabled)
+        menu.addAction(self.cache_action)
+
+        # Keep the input stream open with a short pre-roll so recording starts instantly
+        self.armed_action = QAction("Keep Microphone Armed", self)
+        self.armed_action.setCheckable(True)
+        self.armed_action.setChecked(QSettings().value('audio/armed', False, type=bool))
+        self.armed_action.toggled.connect(self.set_armed)
+        menu.addAction(self.armed_action)
+
+        # Serve the warm models to editor plugins and scripts over localhost HTTP
+        self.service_action = QAction("Local API Server", self)
+        self.service_action.setCheckable(True)
+        self.service_action.setChecked(QSettings().value('service/enabled', False, type=bool))
+        self.service_action.toggled.connect(self.set_service_enabled)
+        menu.addAction(self.service_action)
+
+        # Choose the microphone; the list is read when the menu opens
+        self.device_menu = menu.addMenu("Input Device")
+        self.device_group = QActionGroup(self)
+        self.device_group.triggered.connect(self.set_input_device)
+        self.device_menu.aboutToShow.connect(self.populate_device_menu)
+
+        # Choose how transcribed text is inserted
+        insert_menu = menu.addMenu("Insert Method")
+        insert_group = QActionGroup(self)
+        for label, strategy in (("Clipboard Paste", "clipboard"),
+                                ("Batched Keystrokes", "keystrokes"),
+                                ("Type Each Key", "typing")):
+            action = QAction(label, self)
+            action.setCheckable(True)
+            action.setData(strategy)
+            action.setChecked(strategy == self.text_inserter.strategy)
+            insert_group.addAction(action)
+            insert_menu.addAction(action)
+        insert_group.triggered.connect(self.set_insert_method)
+
+        # Vocabulary, voice commands and filler removal from an editable rules file
+        self.postprocess_action = QAction("Clean Up Text", self)
+        self.postprocess_action.setCheckable(True)
+        self.postprocess_action.setChecked(QSettings().value('text/rules_enabled', True, type=bool))
+        self.postprocess_action.toggled.connect(self.set_postprocess_enabled)
+        menu.addAction(self.postprocess_action)
+        rules_action = QAction("Edit Text Rules...", self)
+        rules_action.triggered.connect(self.edit_text_rules)
+        menu.addAction(rules_action)
         
+        # Show p50/p95 latency per stage of recent dictations
+        stats_action = QAction("Latency Stats", self)
+        stats_action.triggered.connect(self.show_latency_stats)
+        menu.addAction(stats_action)
+
         # Add a quit action
         quit_action = QAction("Quit", self)
-        quit_action.triggered.connect(self.quit)
+        quit_action.triggered.connect(self.quit_app)
         menu.addAction(quit_action)
 
         # Add test notification button to menu
@@ -115,7 +356,76 @@ class WhisperApp(QApplication):
         # Initialize alt key state
         self.alt_pressed = False
 
+        # The tray is visible; do the heavier setup once the event loop runs
+        self.startup_trace = Trace('startup')
+        self.startup_trace.start = STARTUP_START
+        self.startup_trace.add('imports', STARTUP_START, IMPORTS_DONE)
+        self.startup_trace.add('tray_visible', IMPORTS_DONE)
+        print(f"Tray icon visible {(time.perf_counter() - STARTUP_START) * 1000:.0f} ms after launch")
+        QTimer.singleShot(0, self.finish_startup)
+        
+        # Add a delay to let the system tray fully initialize
+        QTimer.singleShot(1000, self.show_startup_notification)
+
+    def finish_startup(self):
+        """Load models, start the transcription worker and listen for the hotkey"""
+        start = time.perf_counter()
+        from model_manager import ModelManager
+        from pipeline import TranscriptionPipeline
+        from longform import LongFormTranscriber
+        from transcript_cache import TranscriptCache
+        from scheduler import Scheduler
+        from postprocess import PostProcessor, ensure_rules_file
+
+        data_dir = QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
+        self.transcript_cache = TranscriptCache(os.path.join(data_dir, 'transcripts.sqlite'),
+                                                enabled=self.cache_action.isChecked())
+
+        # Dictation, API and batch requests share the cores through one scheduler
+        self.scheduler = Scheduler()
+
+        # Initialize whisper models; they load and warm up in the background
+        models_dir = get_resource_path(os.path.join('whisper.cpp', 'models'))
+        try:
+            self.whisper = ModelManager(models_dir, self.create_backend,
+                                        on_warm=self.model_warm.emit, scheduler=self.scheduler)
+            print(f"Whisper models found: {[m.name for m in self.whisper.models]}")
+        except Exception as e:
+            print(f"Error loading whisper model: {e}")
+            traceback_str = traceback.format_exc()
+            print(f"Traceback: {traceback_str}")
+            self.whisper = None
+
+        # Long recordings are split at pauses and transcribed on all cores, chunk by
+        # chunk under the scheduler so they share the core budget with other inference
+        self.longform = (LongFormTranscriber(self.whisper.model_path(), cache_path=self.transcript_cache.path,
+                                             cache_enabled=self.transcript_cache.enabled,
+                                             scheduler=self.scheduler)
+                         if self.whisper else None)
+
+        # Rules are reloaded whenever the file is saved, so edits apply to the next dictation
+        self.postprocess = PostProcessor(ensure_rules_file(os.path.join(data_dir, 'text_rules.txt')),
+                                         enabled=self.postprocess_action.isChecked())
+
+        # Transcribe on a worker thread so the tray stays responsive
+        pipeline = TranscriptionPipeline(self.whisper, longform=self.longform, postprocess=self.postprocess)
+        self.worker = TranscriptionWorker(pipeline, self.insert_text, self.trace_log)
+        self.worker.transcribed.connect(self.handle_transcription)
+        self.worker.failed.connect(self.handle_transcription_error)
+        self.worker.start()
+
+        # Start loading models now that the tray is up
+        self.model_warm.connect(self.handle_model_warm)
+        if self.whisper:
+            self.whisper.start()
+
+        if self.armed_action.isChecked():
+            self.arm_microphone()
+        if self.service_action.isChecked():
+            self.start_service()
+
         # Start listening for hotkey
+        self.hotkey_pressed.connect(self.toggle_recording)
         self.listener = keyboard.Listener(
             on_press=self.on_press,
             on_release=self.on_release
@@ -123,10 +433,199 @@ class WhisperApp(QApplication):
 
         self.listener.start()
         print("Keyboard listener started successfully")
-        
-        # Add a delay to let the system tray fully initialize
-        QTimer.singleShot(1000, self.show_startup_notification)
+
+        self.starting = False
+        self.update_status()
+        self.startup_trace.add('finish_startup', start)
+        self.trace_log.record(self.startup_trace)
+        print(f"Startup complete in {(time.perf_counter() - STARTUP_START) * 1000:.0f} ms")
     
+    def create_backend(self, model_path):
+        """Create a transcription backend for one model file"""
+        from backends import create_backend
+        backend = create_backend(model_path, cache=self.transcript_cache)
+        if self.longform is not None:
+            # Long-form workers use the kind of backend that loaded here instead of probing again
+            self.longform.kind = backend.kind
+        return backend
+
+    def audio_settings(self):
+        """Capture device, block size and latency from the saved settings"""
+        settings = QSettings()
+        latency = settings.value('audio/latency', None)
+        if latency not in (None, '', 'low', 'high'):
+            latency = float(latency)
+        return {
+            'device': settings.value('audio/device', None) or None,
+            'blocksize': int(settings.value('audio/blocksize', 0)),
+            'latency': latency or None,
+            # Long sessions move to an int16 file once this much audio is in RAM; 0 disables
+            'spill_bytes': int(float(settings.value('audio/spill_mb', 64)) * 1024 * 1024) or None,
+        }
+
+    def set_armed(self, armed):
+        """Turn always-armed capture on or off from the tray menu"""
+        QSettings().setValue('audio/armed', armed)
+        if armed:
+            self.arm_microphone()
+        else:
+            self.disarm_microphone()
+
+    def arm_microphone(self):
+        """Open the input stream now and keep it open, filling the pre-roll ring"""
+        if self.armed_recorder is not None or self.is_recording:
+            return
+        preroll = float(QSettings().value('audio/preroll', 0.5))
+        self.armed_recorder = AudioRecorder(preroll_seconds=preroll, **self.audio_settings())
+        self.armed_recorder.finished.connect(self.handle_audio)
+        self.armed_recorder.start()
+        print(f"Microphone armed with {preroll * 1000:.0f} ms pre-roll")
+
+    def disarm_microphone(self):
+        """Close the always-open input stream"""
+        if self.armed_recorder is None:
+            return
+        recorder = self.armed_recorder
+        self.armed_recorder = None
+        if recorder is self.recorder:
+            # Disarmed mid-recording; hand over what was captured so far
+            recorder.end_take()
+            self.recorder = None
+            self.is_recording = False
+            self.update_status()
+        recorder.stop()
+        recorder.wait()
+        print("Microphone disarmed")
+
+    def populate_device_menu(self):
+        """List the input devices, marking the selected one"""
+        import sounddevice as sd
+        current = self.audio_settings()['device']
+        self.device_menu.clear()
+        for action in self.device_group.actions():
+            self.device_group.removeAction(action)
+
+        names = [None] + [d['name'] for d in sd.query_devices() if d['max_input_channels'] > 0]
+        for name in dict.fromkeys(names):
+            action = QAction(name or "System Default", self)
+            action.setCheckable(True)
+            action.setData(name)
+            action.setChecked(name == current)
+            self.device_group.addAction(action)
+            self.device_menu.addAction(action)
+
+    def set_input_device(self, action):
+        """Remember the chosen input device for the next recording"""
+        QSettings().setValue('audio/device', action.data() or '')
+        print(f"Input device: {action.data() or 'system default'}")
+        # An armed stream has to be reopened on the new device
+        if self.armed_recorder is not None and not self.is_recording:
+            self.disarm_microphone()
+            self.arm_microphone()
+
+    def set_cache_enabled(self, enabled):
+        """Turn the transcript cache on or off from the tray menu"""
+        if self.transcript_cache:
+            self.transcript_cache.enabled = enabled
+        if self.longform:
+            # Long-form workers open their own cache when the next recording starts
+            self.longform.cache_enabled = enabled
+        print(f"Transcript cache {'enabled' if enabled else 'bypassed'}")
+
+    def set_service_enabled(self, enabled):
+        """Start or stop the local API server from the tray menu"""
+        QSettings().setValue('service/enabled', enabled)
+        if enabled:
+            self.start_service()
+        else:
+            self.stop_service()
+
+    def start_service(self):
+        """Serve transcription on localhost below dictation in the scheduler"""
+        if self.service is not None or self.whisper is None:
+            return
+        from service import TranscriptionService, DEFAULT_PORT
+        from scheduler import API, BATCH
+        port = int(QSettings().value('service/port', DEFAULT_PORT))
+        service = TranscriptionService(self.whisper.at_priority(API), self.whisper.at_priority(BATCH),
+                                       port=port, stats=self.scheduler.stats, postprocess=self.postprocess)
+        try:
+            service.start_in_thread()
+        except OSError as e:
+            print(f"Could not start the local API server on port {port}: {e}")
+            self.service_action.setChecked(False)
+            return
+        self.service = service
+
+    def stop_service(self):
+        """Stop the local API server"""
+        if self.service is None:
+            return
+        self.service.stop()
+        self.service = None
+        print("Local API server stopped")
+
+    def set_postprocess_enabled(self, enabled):
+        """Turn the text rules on or off from the tray menu"""
+        QSettings().setValue('text/rules_enabled', enabled)
+        if self.postprocess:
+            self.postprocess.enabled = enabled
+        print(f"Text rules {'enabled' if enabled else 'disabled'}")
+
+    def edit_text_rules(self):
+        """Open the rules file in the default editor"""
+        if self.postprocess is None:
+            return
+        QDesktopServices.openUrl(QUrl.fromLocalFile(self.postprocess.path))
+
+    def handle_model_warm(self, name):
+        """Show in the tray that a model is loaded and warmed up"""
+        print(f"Model '{name}' is warm")
+        self.update_status()
+
+    def show_latency_stats(self):
+        """Show per-stage latency percentiles of recent dictations"""
+        text = self.trace_log.format_stats()
+        if self.transcript_cache:
+            cache = self.transcript_cache.stats()
+            text += f"\n\nCache: {cache['hits']} hits, {cache['misses']} misses"
+        if self.service:
+            stats = self.service.stats()
+            text += (f"\n\nAPI server: {sum(stats['requests'].values())} requests, "
+                     f"{stats['pending']}/{stats['max_pending']} in progress")
+        if self.scheduler:
+            stats = self.scheduler.stats()
+            text += f"\n\nScheduler: {stats['running']} running on {stats['cores_in_use']}/{stats['max_cores']} cores"
+            for name, s in stats['priorities'].items():
+                if s['submitted']:
+                    text += (f"\n{name:<12} queued {s['queued']}, wait p50 {s['wait_p50_ms']:.1f} ms, "
+                             f"p95 {s['wait_p95_ms']:.1f} ms")
+        print(text)
+        box = QMessageBox(QMessageBox.Information, "Latency Stats", text)
+        box.setStyleSheet("QLabel { font-family: monospace; }")
+        box.exec()
+
+    def quit_app(self):
+        """Finish queued transcriptions while the event loop still runs, then quit"""
+        # Inserting text can need the GUI thread for the clipboard, so the worker
+        # is drained here rather than from aboutToQuit, after the loop has stopped
+        if self.worker and not self.worker.stop(timeout=10.0):
+            print("Transcription worker did not finish - quitting anyway")
+        self.quit()
+
+    def shutdown_whisper(self):
+        """Release the transcription backend when the app exits"""
+        self.stop_service()
+        # Nothing services clipboard calls from here on; a worker still inserting
+        # text gets an error instead of waiting on this thread
+        self.clipboard_bridge.close()
+        if self.worker:
+            self.worker.stop(timeout=5.0)
+        if self.scheduler:
+            self.scheduler.close(wait=False)
+        if self.whisper and hasattr(self.whisper, 'close'):
+            self.whisper.close()
+
     def test_notification(self):
         """Test function to manually trigger a notification"""
         print("Testing notification...")
@@ -195,7 +694,8 @@ class WhisperApp(QApplication):
                 # Only trigger the action if Alt is pressed
                 if self.alt_pressed:
                     print("Alt+. hotkey detected!")
-                    self.toggle_recording()
+                    # Runs on the listener thread - hand over to the Qt thread
+                    self.hotkey_pressed.emit()
                 else:
                     print("Period pressed without Alt - ignoring")
         except AttributeError as e:
@@ -216,13 +716,22 @@ class WhisperApp(QApplication):
         if not self.is_recording:
             # Start recording
             self.is_recording = True
-            self.status_action.setText("Recording...")
-            self.tray_icon.setToolTip("Recording...")
+            self.update_status()
             
-            # Start recorder thread
-            self.recorder = AudioRecorder()
-            self.recorder.finished.connect(self.handle_audio)
-            self.recorder.start()
+            # Start recorder thread, feeding a streaming transcriber if enabled
+            if self.armed_recorder is not None:
+                # The stream is already open; the take starts with the pre-roll
+                self.recorder = self.armed_recorder
+                self.recorder.begin_take()
+            else:
+                self.recorder = AudioRecorder(**self.audio_settings())
+                self.recorder.finished.connect(self.handle_audio)
+            if self.streaming_action.isChecked() and self.whisper:
+                from streaming import StreamingTranscriber
+                self.recorder.streamer = StreamingTranscriber(self.whisper, self.recorder.buffer)
+                self.recorder.on_data = self.recorder.streamer.notify
+            if self.recorder is not self.armed_recorder:
+                self.recorder.start()
             
             # Before showing notification in toggle_recording, add:
             old_icon = self.tray_icon.icon()
@@ -256,12 +765,30 @@ class WhisperApp(QApplication):
                 1000
             )
             
-            # Then stop the recorder
+            # Then stop the recorder; it stays referenced until its audio arrives
             if self.recorder:
-                self.recorder.stop()
+                # Latency is measured from the stop hotkey to inserted text
+                self.recorder.trace = Trace()
+                if self.recorder is self.armed_recorder:
+                    # Nothing to tear down; the audio is handed over right away
+                    self.recorder.end_take()
+                else:
+                    self.recorder.stop()
+                    self.stopping_recorders.append(self.recorder)
+                self.recorder = None
     
     def handle_audio(self, audio):
-        """Process recorded audio and insert transcribed text at cursor position"""
+        """Queue a finished recording for the background transcription worker"""
+        recorder = self.sender()
+        streamer = getattr(recorder, 'streamer', None)
+        trace = getattr(recorder, 'trace', None)
+        if trace:
+            trace.add('capture_teardown', trace.start)
+        # The recorder thread is exiting; let it finish before dropping it
+        if recorder in self.stopping_recorders:
+            recorder.wait()
+            self.stopping_recorders.remove(recorder)
+
         if not self.whisper:
             self.tray_icon.showMessage(
                 "Error",
@@ -269,53 +796,77 @@ class WhisperApp(QApplication):
                 QSystemTrayIcon.Critical,
                 3000
             )
-            self.status_action.setText("Ready")
-            self.tray_icon.setToolTip("Whisper Transcriber")
+            self.update_status()
             return
-        
-        try:
-            # Update status
-            self.status_action.setText("Transcribing...")
-            self.tray_icon.setToolTip("Transcribing...")
-            
-            # Begin transcription
-            text = self.whisper.transcribe(audio)
-            
-            # Insert text at cursor position
-            if text:
-                # Add a small delay to ensure the application is ready
-                time.sleep(0.5)
-                
-                # Type the transcribed text
-                pyautogui.write(text)
-                
-                # Show notification
-                self.tray_icon.showMessage(
-                    "Transcription Complete",
-                    f"Inserted: {text[:30]}{'...' if len(text) > 30 else ''}",
-                    QSystemTrayIcon.Information,
-                    2000
-                )
-            else:
-                self.tray_icon.showMessage(
-                    "No Speech Detected",
-                    "Try speaking more clearly or adjusting your microphone",
-                    QSystemTrayIcon.Information,
-                    2000
-                    )
-        except Exception as e:
+
+        if len(audio) == 0 and not streamer:
+            self.update_status()
+            return
+
+        self.pending_jobs += 1
+        self.update_status()
+        self.worker.submit(audio, streamer, trace)
+
+    def insert_text(self, text):
+        """Insert transcribed text at the cursor; runs on the worker thread"""
+        self.text_inserter.insert(text)
+
+    def set_insert_method(self, action):
+        """Switch the text insertion strategy from the tray menu"""
+        self.text_inserter.strategy = action.data()
+        print(f"Text insertion method: {action.data()}")
+
+    def handle_transcription(self, text):
+        """Report a finished transcription from the worker"""
+        self.pending_jobs -= 1
+        if text:
+            # Show notification
             self.tray_icon.showMessage(
-                "Error",
-                f"Transcription failed: {e}",
-                QSystemTrayIcon.Critical,
-                3000
+                "Transcription Complete",
+                f"Inserted: {text[:30]}{'...' if len(text) > 30 else ''}",
+                QSystemTrayIcon.Information,
+                2000
             )
-            print(f"Error during transcription: {e}")
-        
-        # Reset status
-        self.status_action.setText("Ready")
-        self.tray_icon.setToolTip("Whisper Transcriber")
+        else:
+            self.tray_icon.showMessage(
+                "No Speech Detected",
+                "Try speaking more clearly or adjusting your microphone",
+                QSystemTrayIcon.Information,
+                2000
+                )
+        self.update_status()
+
+    def handle_transcription_error(self, message):
+        """Report a failed transcription from the worker"""
+        self.pending_jobs -= 1
+        self.tray_icon.showMessage(
+            "Error",
+            f"Transcription failed: {message}",
+            QSystemTrayIcon.Critical,
+            3000
+        )
+        self.update_status()
+
+    def update_status(self):
+        """Show recording/processing state in the tray menu and tooltip"""
+        if self.starting:
+            status = "Starting..."
+        elif self.is_recording:
+            status = "Recording..."
+        elif self.pending_jobs:
+            status = f"Transcribing... ({self.pending_jobs} queued)" if self.pending_jobs > 1 else "Transcribing..."
+        elif self.whisper and not self.whisper.warm_models:
+            status = "Loading model..."
+        else:
+            warm = f" (warm: {', '.join(self.whisper.warm_models)})" if self.whisper else ""
+            self.status_action.setText(f"Ready{warm}")
+            self.tray_icon.setToolTip(f"Whisper Transcriber{warm}")
+            return
+        self.status_action.setText(status)
+        self.tray_icon.setToolTip(status)
 
 if __name__ == "__main__":
+    # Needed for the long-form process pool in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
     app = WhisperApp(sys.argv)
     sys.exit(app.exec())
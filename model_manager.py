@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from tracing import annotate
+from scheduler import INTERACTIVE
+
+# Model tiers from fastest to most accurate
+MODEL_TIERS = [
+    ('tiny', 'ggml-tiny.en.bin'),
+    ('base', 'ggml-base.en.bin'),
+    ('small', 'ggml-small.en.bin'),
+]
+
+
+class ManagedModel:
+    """One model tier, its backend and its measured speed"""
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.backend = None
+        self.warm = False
+        # Measured seconds of processing per second of audio
+        self.cost_per_second = None
+
+    def estimate(self, duration):
+        """Predict how long transcribing `duration` seconds of audio will take"""
+        return self.cost_per_second * duration
+
+    def record(self, duration, elapsed):
+        """Fold a measured transcription time into the speed estimate"""
+        cost = elapsed / max(duration, 0.1)
+        if self.cost_per_second is None:
+            self.cost_per_second = cost
+        else:
+            self.cost_per_second = 0.8 * self.cost_per_second + 0.2 * cost
+
+
+class ModelManager:
+    """Loads and warms whisper models in the background and picks one per utterance"""
+    def __init__(self, models_dir, backend_factory, default='base', sample_rate=16000,
+                 short_utterance_seconds=3.0, latency_budget=1.0, latency_per_second=0.25,
+                 on_warm=None, scheduler=None):
+        self.backend_factory = backend_factory
+        # Shared Scheduler that orders and caps inference across callers, if any
+        self.scheduler = scheduler
+        self.default = default
+        self.sample_rate = sample_rate
+        # Commands shorter than this always go to the fastest warm model
+        self.short_utterance_seconds = short_utterance_seconds
+        # Allowed wait for an utterance: a fixed part plus a share of its length
+        self.latency_budget = latency_budget
+        self.latency_per_second = latency_per_second
+        # Called from the loader thread with the model name each time one is warm
+        self.on_warm = on_warm
+
+        self.models = [
+            ManagedModel(name, os.path.join(models_dir, filename))
+            for name, filename in MODEL_TIERS
+            if os.path.exists(os.path.join(models_dir, filename))
+        ]
+        if not self.models:
+            raise FileNotFoundError(f"No whisper models found in {models_dir}")
+
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Load and warm every available model on a background thread"""
+        self._thread = threading.Thread(target=self._load_all, daemon=True)
+        self._thread.start()
+
+    def select(self, duration):
+        """Pick the model for an utterance of `duration` seconds"""
+        warm = [m for m in self.models if m.warm]
+        if not warm:
+            return None
+        if duration <= self.short_utterance_seconds:
+            return warm[0]
+
+        budget = self.latency_budget + self.latency_per_second * duration
+        fitting = [m for m in warm if m.estimate(duration) <= budget]
+        return fitting[-1] if fitting else warm[0]
+
+    def transcribe(self, audio_data, priority=INTERACTIVE):
+        return self._run('transcribe', audio_data, priority)
+
+    def transcribe_segments(self, audio_data, priority=INTERACTIVE):
+        return self._run('transcribe_segments', audio_data, priority)
+
+    def at_priority(self, priority):
+        """A backend-like view whose calls are scheduled at the given priority"""
+        return PriorityView(self, priority)
+
+    def _run(self, method, audio_data, priority):
+        """Pick a model for the audio and run one of its backend methods"""
+        # Wait for the first model to finish loading rather than fail the dictation
+        self._ready.wait()
+        duration = len(audio_data) / self.sample_rate
+        model = self.select(duration)
+        if model is None:
+            raise RuntimeError("No whisper model is loaded")
+        print(f"Using '{model.name}' model for {duration:.1f}s of audio")
+        annotate(model=model.name)
+
+        def timed():
+            # Timed inside the job so queueing doesn't skew the speed estimate
+            start = time.perf_counter()
+            result = getattr(model.backend, method)(audio_data)
+            if not hasattr(model.backend, 'on_inference'):
+                model.record(duration, time.perf_counter() - start)
+            return result
+
+        if self.scheduler is None:
+            return timed()
+        capabilities = model.backend.capabilities
+        # A backend that serves one call at a time gets one job at a time, so queued
+        # jobs wait in the scheduler (by priority) rather than on the backend's lock
+        return self.scheduler.run(timed, priority=priority, cost=capabilities.threads,
+                                  resource=None if capabilities.concurrent else model.backend)
+
+    def model_path(self, name=None):
+        """Path of the named model, or of the default model"""
+        name = name or self.default
+        for model in self.models:
+            if model.name == name:
+                return model.path
+        return self.models[-1].path
+
+    @property
+    def warm_models(self):
+        """Names of the models that are loaded and warmed up"""
+        return [m.name for m in self.models if m.warm]
+
+    def close(self):
+        """Shut down every loaded backend"""
+        for model in self.models:
+            if model.backend is not None and hasattr(model.backend, 'close'):
+                model.backend.close()
+
+    def _load_all(self):
+        """Warm the default model first, then the other tiers"""
+        order = sorted(self.models, key=lambda m: m.name != self.default)
+        for model in order:
+            try:
+                self._warm_up(model)
+            except Exception as e:
+                print(f"Error loading '{model.name}' model: {e}")
+
+        if not self._ready.is_set():
+            print("No whisper model could be loaded")
+            # Release waiting transcriptions so they fail instead of hanging
+            self._ready.set()
+
+    def _warm_up(self, model):
+        """Create the backend and run a short dummy inference to pull in the model"""
+        start = time.perf_counter()
+        model.backend = self.backend_factory(model.path)
+        if hasattr(model.backend, 'on_inference'):
+            # A cached backend times only the calls that miss and reach the model
+            model.backend.on_inference = model.record
+
+        # Two seconds of silence exercises the whole inference path
+        inference_start = time.perf_counter()
+        model.backend.warm_up(2.0, self.sample_rate)
+        model.record(2.0, time.perf_counter() - inference_start)
+
+        model.warm = True
+        self._ready.set()
+        print(f"Model '{model.name}' warm in {time.perf_counter() - start:.2f}s "
+              f"({model.cost_per_second:.3f}s per audio second)")
+        if self.on_warm:
+            self.on_warm(model.name)
+
+
+class PriorityView:
+    """ModelManager calls at a fixed scheduler priority, e.g. for API or batch callers"""
+    def __init__(self, manager, priority):
+        self.manager = manager
+        self.priority = priority
+
+    def transcribe(self, audio_data):
+        return self.manager.transcribe(audio_data, self.priority)
+
+    def transcribe_segments(self, audio_data):
+        return self.manager.transcribe_segments(audio_data, self.priority)
@@ -0,0 +1,65 @@
+import struct
+import threading
+import numpy as np
+
+SAMPLE_RATE = 16000
+WAV_HEADER_SIZE = 44
+
+# Samples converted per step; small enough that the float scratch stays in cache
+_BLOCK_SAMPLES = 16384
+
+
+def wav_header(n_samples, sample_rate=SAMPLE_RATE):
+    """Build a 16-bit mono PCM WAV header"""
+    data_size = n_samples * 2
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b'data', data_size
+    )
+
+
+class PcmEncoder:
+    """Converts float32 audio to int16 PCM/WAV into reusable buffers"""
+    def __init__(self, sample_rate=SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self._scratch = np.empty(_BLOCK_SAMPLES, dtype=np.float32)
+        self._wav = bytearray()
+
+    def to_int16(self, audio_data, out):
+        """Clip and scale audio into the int16 array `out` in a single pass"""
+        audio_data = np.asarray(audio_data, dtype=np.float32).reshape(-1)
+        n = len(audio_data)
+        # Work block by block so each sample is read from memory once
+        for start in range(0, n, _BLOCK_SAMPLES):
+            block = audio_data[start:start + _BLOCK_SAMPLES]
+            scratch = self._scratch[:len(block)]
+            np.clip(block, -1.0, 1.0, out=scratch)
+            np.multiply(scratch, 32767, out=out[start:start + len(block)], casting='unsafe')
+        return out[:n]
+
+    def encode_wav(self, audio_data):
+        """Return a memoryview of the audio as a WAV file, valid until the next call"""
+        n = len(audio_data)
+        size = WAV_HEADER_SIZE + n * 2
+        if len(self._wav) < size:
+            # Grow geometrically so repeated dictations stop reallocating
+            self._wav = bytearray(max(size, len(self._wav) * 2))
+
+        view = memoryview(self._wav)
+        view[:WAV_HEADER_SIZE] = wav_header(n, self.sample_rate)
+        samples = np.frombuffer(self._wav, dtype=np.int16, count=n, offset=WAV_HEADER_SIZE)
+        self.to_int16(audio_data, samples)
+        return view[:size]
+
+
+_local = threading.local()
+
+
+def encode_wav(audio_data, sample_rate=SAMPLE_RATE):
+    """Encode audio as an in-memory WAV using a per-thread encoder"""
+    encoder = getattr(_local, 'encoder', None)
+    if encoder is None or encoder.sample_rate != sample_rate:
+        encoder = _local.encoder = PcmEncoder(sample_rate)
+    return encoder.encode_wav(audio_data)
@@ -0,0 +1,59 @@
+from vad import trim_silence
+from longform import iter_chunks
+from tracing import span, annotate
+
+
+class TranscriptionPipeline:
+    """Runs a finished recording through silence trimming and the transcription backend"""
+    def __init__(self, whisper, sample_rate=16000, longform=None, longform_seconds=300,
+                 postprocess=None):
+        self.whisper = whisper
+        self.sample_rate = sample_rate
+        # Recordings at least this long are chunked across a process pool
+        self.longform = longform
+        self.longform_seconds = longform_seconds
+        # PostProcessor applying vocabulary, voice commands and filler removal
+        self.postprocess = postprocess
+
+    def run(self, audio, streamer=None):
+        """Return the text for a recording, after the text rules"""
+        text = self._transcribe(audio, streamer)
+        if self.postprocess is not None and text:
+            with span('postprocess'):
+                text = self.postprocess.process(text)
+        return text
+
+    def _transcribe(self, audio, streamer):
+        """Return the raw text for a recording; in streaming mode only the tail is left"""
+        annotate(audio_seconds=round(len(audio) / self.sample_rate, 3))
+        if streamer is not None:
+            with span('streaming_tail'):
+                return streamer.finish()
+        if hasattr(audio, 'read'):
+            # Spilled to disk: read back and transcribe chunk by chunk
+            with span('spilled'):
+                return self._run_spilled(audio)
+
+        # Drop leading/trailing silence so whisper only sees speech
+        with span('vad'):
+            vad = trim_silence(audio, self.sample_rate)
+        annotate(vad_removed_seconds=round(vad.removed_seconds, 3))
+        print(f"VAD removed {vad.removed_seconds:.2f}s of {len(audio) / self.sample_rate:.2f}s")
+        if not vad.has_speech:
+            return ""
+        if self.longform is not None and len(vad.audio) >= self.longform_seconds * self.sample_rate:
+            with span('longform'):
+                return self.longform.transcribe_text(vad.audio)
+        with span('transcribe'):
+            return self.whisper.transcribe(vad.audio)
+
+    def _run_spilled(self, audio):
+        """Transcribe a recording that lives on disk without loading it whole"""
+        if self.longform is not None:
+            return self.longform.transcribe_text(audio)
+        texts = []
+        for _, chunk in iter_chunks(audio, self.sample_rate):
+            vad = trim_silence(chunk, self.sample_rate)
+            if vad.has_speech:
+                texts.append(self.whisper.transcribe(vad.audio))
+        return ' '.join(text for text in texts if text)
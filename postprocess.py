@@ -0,0 +1,325 @@
+"""Post-processing of transcribed text before it is inserted.
+
+Applies a rules file of custom vocabulary, voice commands ("new line",
+"comma") and filler words to be dropped. All rules are compiled into one
+regex, with the phrases arranged as a trie so matching cost doesn't grow with
+the number of entries, and each match is resolved by a dict lookup. The
+compiled rules are cached and rebuilt only when the file changes.
+
+Rules file format:
+
+    # comment
+    [vocabulary]
+    kubernetes => Kubernetes
+    jason => JSON
+    [commands]
+    new line => \\n
+    comma => ,
+    [fillers]
+    um
+    uh
+
+Phrases match case-insensitively on word boundaries, ignoring the commas the
+model puts between words.
+"""
+import functools
+import os
+import re
+
+VOCABULARY = 'vocabulary'
+COMMAND = 'command'
+FILLER = 'filler'
+SECTIONS = {'vocabulary': VOCABULARY, 'commands': COMMAND, 'fillers': FILLER}
+
+DEFAULT_RULES = """\
+# Text rules for dictation, applied to every transcription.
+# Lines are "spoken => written"; fillers are listed one per line and removed.
+
+[vocabulary]
+# kubernetes => Kubernetes
+
+[commands]
+# Commands replace the spoken words wherever they occur, so "the colon is an
+# organ" would lose a word. Uncomment the ones you want, or give them a prefix
+# you won't say otherwise, e.g. "insert comma => ,".
+# new line => \\n
+# new paragraph => \\n\\n
+# comma => ,
+# full stop => .
+# question mark => ?
+# exclamation mark => !
+# colon => :
+# semicolon => ;
+
+[fillers]
+um
+umm
+uh
+uhh
+erm
+hmm
+"""
+
+# Words of a phrase may be separated by whitespace and commas in the transcript
+_SEPARATOR = r'[\s,]+'
+_SEPARATOR_RE = re.compile(_SEPARATOR)
+# Marks where the next word should be capitalized, e.g. after a "new line" command
+_CAPITALIZE = '\x00'
+_SENTENCE_END = ('.', '!', '?', '\n')
+# Characters after which a filler stands as its own sentence
+_SENTENCE_BREAK = '.!?\n' + _CAPITALIZE
+
+_SPACE_BEFORE_PUNCTUATION = re.compile(r'[ \t]+(?=[,.;:!?])')
+_DOUBLED_PUNCTUATION = re.compile(r'[,;:]+(?=[,.;:!?])')
+_SPACE_AROUND_NEWLINE = re.compile(r'[ \t]*\n[ \t]*')
+_REPEATED_SPACE = re.compile(r'[ \t]{2,}')
+_CAPITALIZE_NEXT = re.compile(_CAPITALIZE + r'(\W*?)(\w)')
+_WORD = re.compile(r'\S+')
+
+
+def normalize_phrase(phrase):
+    """Lookup key for a spoken phrase: lowercase, words separated by single spaces"""
+    return _SEPARATOR_RE.sub(' ', phrase.lower()).strip()
+
+
+def parse_rules(text):
+    """Parse a rules file into {phrase: (kind, replacement)}"""
+    rules = {}
+    kind = VOCABULARY
+    for line_no, raw in enumerate(text.splitlines(), 1):
+        line = raw.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('[') and line.endswith(']'):
+            section = line[1:-1].strip().lower()
+            if section not in SECTIONS:
+                raise ValueError(f"line {line_no}: unknown section [{section}]")
+            kind = SECTIONS[section]
+            continue
+        if kind == FILLER:
+            spoken, written = line, ''
+        else:
+            spoken, arrow, written = line.partition('=>')
+            if not arrow:
+                raise ValueError(f"line {line_no}: expected 'spoken => written'")
+            written = written.strip().replace('\\n', '\n').replace('\\t', '\t')
+        key = normalize_phrase(spoken)
+        if key:
+            rules[key] = (kind, written)
+    return rules
+
+
+def _trie_pattern(phrases):
+    """One regex alternation for many phrases, with shared prefixes factored out"""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        # The empty key marks the end of a phrase
+        node[''] = {}
+
+    def build(node):
+        branches = [(_SEPARATOR if ch == ' ' else re.escape(ch)) + build(child)
+                    for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            # A shorter phrase ends here; the greedy ? prefers the longer one
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+class Rules:
+    """A compiled rule set"""
+    def __init__(self, rules):
+        self.rules = rules
+        # Longest phrase in words, i.e. how far a match can reach back in a stream
+        self.max_words = max((key.count(' ') + 1 for key in rules), default=0)
+        if rules:
+            # A comma before the phrase and punctuation after it are captured so
+            # commands and fillers can drop what the model added around them
+            self.pattern = re.compile(r"(,[ \t]*)?(?<![\w'])(" + _trie_pattern(rules) +
+                                      r")(?![\w'])([,.;:!?]?)", re.IGNORECASE)
+        else:
+            self.pattern = None
+
+    def apply(self, text):
+        """Rewrite one piece of text"""
+        text, count = self.substitute(text)
+        return tidy(text) if count else text
+
+    def substitute(self, text, sentence_start=True):
+        """Replace every rule match; returns (text, number of matches)
+
+        sentence_start says whether text begins a sentence, for text that
+        continues earlier pieces. Leaves capitalization markers and loose
+        spacing for tidy().
+        """
+        if self.pattern is None:
+            return text, 0
+        return self.pattern.subn(lambda match: self._replace(match, sentence_start), text)
+
+    def _replace(self, match, sentence_start):
+        lead, spoken, trail = match.group(1) or '', match.group(2), match.group(3)
+        kind, written = self.rules[normalize_phrase(spoken)]
+        if kind == VOCABULARY:
+            if spoken[0].isupper() and written[:1].islower():
+                written = written[0].upper() + written[1:]
+            return lead + written + trail
+        if kind == FILLER:
+            if not match.group(1) and _starts_sentence(match.string, match.start(), sentence_start):
+                # A filler on its own takes its punctuation along: "Hmm. okay" -> "Okay"
+                return _CAPITALIZE
+            # Inside a sentence: "I think, um, that" -> "I think that"; "I think, um." -> "I think."
+            return '' if trail == ',' else trail
+        # Commands replace the punctuation the model put around the spoken words
+        return written + (_CAPITALIZE if written.rstrip(' \t').endswith(_SENTENCE_END) else '')
+
+
+def _starts_sentence(text, position, sentence_start):
+    """Whether position is the first word of a sentence, looking back past spaces"""
+    position -= 1
+    while position >= 0 and text[position] in ' \t':
+        position -= 1
+    return sentence_start if position < 0 else text[position] in _SENTENCE_BREAK
+
+
+def tidy(text, strip=True):
+    """Fix spacing and capitalization around the text the rules inserted or removed"""
+    if _CAPITALIZE in text:
+        text = _CAPITALIZE_NEXT.sub(lambda m: m.group(1) + m.group(2).upper(), text)
+        text = text.replace(_CAPITALIZE, '')
+    text = _SPACE_AROUND_NEWLINE.sub('\n', text)
+    text = _SPACE_BEFORE_PUNCTUATION.sub('', text)
+    text = _DOUBLED_PUNCTUATION.sub('', text)
+    text = _REPEATED_SPACE.sub(' ', text)
+    if strip:
+        text = text.strip(' \t').lstrip(',;:')
+    return text
+
+
+@functools.lru_cache(maxsize=4)
+def compile_rules(text):
+    """Compile the text of a rules file; repeated calls with the same text are free"""
+    return Rules(parse_rules(text))
+
+
+def ensure_rules_file(path):
+    """Create the rules file with the default rules if there isn't one yet"""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(DEFAULT_RULES)
+    return path
+
+
+class PostProcessor:
+    """Applies a rules file to transcriptions, reloading it when the file changes"""
+    def __init__(self, path=None, enabled=True, rules_text=DEFAULT_RULES):
+        # Without a path the given rules text is used as is
+        self.path = path
+        self.enabled = enabled
+        self._rules = compile_rules(rules_text) if path is None else None
+        self._signature = None
+
+    @property
+    def rules(self):
+        """The compiled rules, rebuilt only if the file's size or mtime changed"""
+        if self.path is None:
+            return self._rules
+        try:
+            st = os.stat(self.path)
+            signature = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            signature = None
+        if signature != self._signature or self._rules is None:
+            self._signature = signature
+            self._rules = self._load(signature)
+        return self._rules
+
+    def _load(self, signature):
+        if signature is None:
+            return compile_rules('')
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                rules = compile_rules(f.read())
+        except (OSError, ValueError) as e:
+            # Keep the last good rules rather than insert unprocessed text
+            print(f"Error loading text rules from {self.path}: {e}")
+            return self._rules or compile_rules('')
+        print(f"Loaded {len(rules.rules)} text rules from {self.path}")
+        return rules
+
+    def process(self, text):
+        """Apply the rules to a complete transcription"""
+        if not self.enabled or not text:
+            return text
+        return self.rules.apply(text)
+
+    def stream(self):
+        """An incremental processor for text that arrives in pieces"""
+        return IncrementalPostProcessor(self)
+
+
+class IncrementalPostProcessor:
+    """Applies rules to streaming partial results
+
+    The last few words are held back until more text arrives, since they could
+    be the start of a longer phrase, so phrases split across pieces still match.
+    """
+    def __init__(self, processor):
+        self.processor = processor
+        self._pending = ''
+        self._capitalize = False
+        self._sentence_start = True
+        self._started = False
+        self._line_ended = False
+
+    def feed(self, text):
+        """Add the next piece of text; returns the text that is now final"""
+        self._pending = f"{self._pending} {text}" if self._pending else text
+        if not self.processor.enabled:
+            return self._release(len(self._pending), None)
+        rules = self.processor.rules
+        words = [m.start() for m in _WORD.finditer(self._pending)]
+        if len(words) <= rules.max_words:
+            return ''
+        cut = words[len(words) - rules.max_words] if rules.max_words else len(self._pending)
+        # Never split a match; it is processed whole with the next piece
+        if rules.pattern is not None:
+            for match in rules.pattern.finditer(self._pending):
+                if match.start() >= cut:
+                    break
+                if match.end() > cut:
+                    cut = match.start()
+                    break
+        return self._release(cut, rules)
+
+    def finish(self):
+        """Return whatever is still held back"""
+        rules = self.processor.rules if self.processor.enabled else None
+        return self._release(len(self._pending), rules)
+
+    def _release(self, cut, rules):
+        text, self._pending = self._pending[:cut], self._pending[cut:]
+        if rules is not None:
+            text, _ = rules.substitute(_CAPITALIZE + text if self._capitalize else text,
+                                       sentence_start=self._sentence_start)
+            # A command at the end of this piece capitalizes the first word of the next
+            self._capitalize = text.rstrip(' \t').endswith(_CAPITALIZE)
+            # Only the very start of the stream loses leading commas
+            text = tidy(text, strip=not self._started)
+        text = text.strip(' \t')
+        if not text:
+            return ''
+        # Pieces are joined by a space, except before punctuation or after a line break
+        if self._started and not self._line_ended and not text.startswith(('\n', ',', '.', ';', ':', '!', '?')):
+            text = ' ' + text
+        self._started = True
+        self._line_ended = text.endswith('\n')
+        self._sentence_start = text.rstrip(' \t').endswith(_SENTENCE_END)
+        return text
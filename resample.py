@@ -0,0 +1,160 @@
+import math
+import numpy as np
+
+
+def kaiser_lowpass(up, down, taps_per_phase=32, beta=8.0, rolloff=0.9):
+    """Kaiser-windowed sinc prototype filter for resampling by up/down
+
+    taps_per_phase is the length at a 1:1 ratio. The filter grows with
+    max(up, down) so that it always spans the same number of cutoff periods;
+    a fixed length would give decimation (up == 1) a wide transition band and
+    poor alias rejection. Returned as an (up, taps) polyphase matrix with each
+    phase's taps reversed, so an output sample is one dot product with the
+    input window.
+    """
+    taps = -(-taps_per_phase * max(up, down) // up)
+    n_taps = taps * up
+    # Cutoff at the lower of the two Nyquist rates, in cycles per upsampled sample
+    cutoff = rolloff * 0.5 / max(up, down)
+    # Odd length so the group delay is a whole number of samples; the spare tap stays zero
+    length = n_taps if n_taps % 2 else n_taps - 1
+    t = np.arange(length) - (length - 1) / 2
+    prototype = np.zeros(n_taps)
+    prototype[:length] = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(length, beta)
+    # Interpolation by up spreads each input sample's energy over up outputs
+    prototype *= up / prototype.sum()
+    return np.ascontiguousarray(prototype.reshape(taps, up).T[:, ::-1], dtype=np.float32)
+
+
+class PolyphaseResampler:
+    """Incremental rational resampler; feed blocks of any size, get the same result as one call"""
+    def __init__(self, rate_in, rate_out=16000, taps_per_phase=32):
+        g = math.gcd(int(rate_in), int(rate_out))
+        self.rate_in = int(rate_in)
+        self.rate_out = int(rate_out)
+        self.up = self.rate_out // g
+        self.down = self.rate_in // g
+        self._filters = kaiser_lowpass(self.up, self.down, taps_per_phase)
+        # Taps per phase after scaling for the rate ratio
+        self.taps = self._filters.shape[1]
+        # Shift outputs by the filter's group delay so they line up with the input
+        self._delay = (self.taps * self.up - 1) // 2
+
+        # Input history plus the current block, and the output block, reused across calls
+        self._window = np.zeros(4096 + self.taps, dtype=np.float32)
+        self._out = np.empty(0, dtype=np.float32)
+        # Output k uses filter phase (k * down + delay) % up, which repeats every up
+        # outputs; the cycle is tiled so any run of outputs reads its taps as a slice
+        self._cycle = self._filters[(np.arange(self.up) * self.down + self._delay) % self.up]
+        # Per-output input positions, a contiguous copy of the input windows (which
+        # take() would otherwise copy itself), the gathered windows and the tiled
+        # taps, grown with the blocks so process() doesn't allocate per call
+        self._frames = np.empty((0, self.taps), dtype=np.float32)
+        self._steps = np.empty(0, dtype=np.int64)
+        self._positions = np.empty(0, dtype=np.int64)
+        self._rows = np.empty((0, self.taps), dtype=np.float32)
+        self._coefs = np.empty((0, self.taps), dtype=np.float32)
+        self._consumed = 0
+        self._produced = 0
+
+    def reset(self):
+        """Forget all state, e.g. before a new recording"""
+        self._window[:self.taps - 1] = 0
+        self._consumed = 0
+        self._produced = 0
+
+    def process(self, block):
+        """Resample one block of float32 mono samples
+
+        Returns a view of an internal buffer that is overwritten by the next call.
+        """
+        n = len(block)
+        history = self.taps - 1
+        if history + n > len(self._window):
+            grown = np.zeros(2 * (history + n), dtype=np.float32)
+            grown[:history] = self._window[:history]
+            self._window = grown
+        window = self._window[:history + n]
+        window[history:] = block
+
+        # Output k needs input up to floor((k * down + delay) / up)
+        last_input = self._consumed + n - 1
+        end = (last_input * self.up + self.up - 1 - self._delay) // self.down + 1
+        count = max(0, end - self._produced)
+        if len(self._out) < count:
+            self._grow(2 * count)
+        out = self._out[:count]
+
+        if count:
+            # window[s:s + taps] holds inputs base - taps + 1 .. base for output base
+            frames = np.lib.stride_tricks.sliding_window_view(window, self.taps)
+            if self.up == 1:
+                # Integer decimation: every output uses the same taps at a fixed
+                # stride; matmul reads the strided view where dot would copy it
+                first = self._produced * self.down + self._delay - self._consumed
+                np.matmul(frames[first::self.down][:count], self._filters[0], out=out)
+            else:
+                if len(self._frames) < n:
+                    self._frames = np.empty((2 * n, self.taps), dtype=np.float32)
+                contiguous = self._frames[:n]
+                np.copyto(contiguous, frames)
+                # Window start of each output, gathered into the scratch rows; the
+                # positions are in range by construction, and mode='clip' lets
+                # take() write into out without buffering it
+                positions = self._positions[:count]
+                np.add(self._steps[:count], self._produced, out=positions)
+                positions *= self.down
+                positions += self._delay
+                positions //= self.up
+                positions -= self._consumed
+                rows = np.take(contiguous, positions, axis=0, out=self._rows[:count], mode='clip')
+                phase = self._produced % self.up
+                np.einsum('ij,ij->i', rows, self._coefs[phase:phase + count], out=out)
+
+        # Keep the last taps - 1 inputs for the next block
+        window[:history] = window[n:]
+        self._consumed += n
+        if count:
+            self._produced = end
+        return out
+
+    def _grow(self, size):
+        """Resize the output block and the scratch buffers to hold size outputs"""
+        self._out = np.empty(size, dtype=np.float32)
+        if self.up > 1:
+            self._steps = np.arange(size, dtype=np.int64)
+            self._positions = np.empty(size, dtype=np.int64)
+            self._rows = np.empty((size, self.taps), dtype=np.float32)
+            # One extra cycle so a run can start at any phase
+            self._coefs = np.tile(self._cycle, (-(-size // self.up) + 1, 1))
+
+    def flush(self):
+        """Emit the outputs still held back by the filter delay; pads with silence"""
+        # Outputs that correspond to real input, given how much input was consumed
+        total = (self._consumed * self.up + self.down - 1) // self.down
+        missing = total - self._produced
+        if missing <= 0:
+            return self._out[:0]
+        pad = (missing * self.down) // self.up + self.taps
+        return self.process(np.zeros(pad, dtype=np.float32))[:missing]
+
+
+def downmix(block, out=None):
+    """Average a (frames, channels) block to mono, into out when given"""
+    if block.ndim == 1:
+        return block
+    if block.shape[1] == 1:
+        # A strided view - nothing to compute
+        return block[:, 0]
+    if out is None or len(out) < len(block):
+        out = np.empty(len(block), dtype=np.float32)
+    return np.mean(block, axis=1, dtype=np.float32, out=out[:len(block)])
+
+
+def resample_audio(audio, rate, target_rate=16000):
+    """Resample a whole clip in one call"""
+    if rate == target_rate:
+        return np.asarray(audio, dtype=np.float32)
+    resampler = PolyphaseResampler(rate, target_rate)
+    head = resampler.process(np.asarray(audio, dtype=np.float32)).copy()
+    return np.concatenate((head, resampler.flush()))
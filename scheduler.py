@@ -0,0 +1,216 @@
+import asyncio
+import collections
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future
+from backends import Backend
+from tracing import current_trace
+
+# Lower runs first: dictation beats API requests, which beat batch work
+INTERACTIVE = 0
+API = 1
+BATCH = 2
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', API: 'api', BATCH: 'batch'}
+
+
+class _Job:
+    def __init__(self, fn, args, priority, cost, resource):
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.cost = cost
+        # Jobs sharing a resource run one at a time, e.g. calls on a non-concurrent backend
+        self.resource = resource
+        self.future = Future()
+        # Spans land in the submitter's trace even though the job runs elsewhere
+        self.trace = current_trace()
+        self.queued_at = time.perf_counter()
+
+
+class Scheduler:
+    """Runs inference jobs by priority while capping the cores they use together
+
+    Each job has a cost, normally the whisper threads it runs with; jobs start
+    only while the running costs fit in max_cores. The highest-priority job
+    waits for room rather than letting lower-priority work jump ahead of it.
+    Jobs given the same resource (a backend that serves one call at a time)
+    never run together: the others stay queued, holding no cores, so the
+    highest-priority one is picked as soon as the resource is free.
+    """
+    def __init__(self, max_cores=None, keep=1000):
+        self.max_cores = max_cores or os.cpu_count() or 1
+        self._queue = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._used = 0
+        self._running = 0
+        self._busy = set()
+        self._closed = False
+        self._submitted = collections.Counter()
+        self._completed = collections.Counter()
+        self._waits = {priority: collections.deque(maxlen=keep) for priority in PRIORITY_NAMES}
+        # One thread per core is enough: no more jobs than cores can ever run
+        self._threads = [threading.Thread(target=self._run, daemon=True, name=f'scheduler-{i}')
+                         for i in range(self.max_cores)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args, priority=INTERACTIVE, cost=1, resource=None):
+        """Queue fn(*args) and return a concurrent.futures.Future for its result"""
+        job = _Job(fn, args, priority, min(max(1, cost), self.max_cores), resource)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Scheduler is closed")
+            heapq.heappush(self._queue, (priority, next(self._order), job))
+            self._submitted[priority] += 1
+            self._cond.notify_all()
+        return job.future
+
+    def run(self, fn, *args, priority=INTERACTIVE, cost=1, resource=None):
+        """Submit and wait for the result"""
+        return self.submit(fn, *args, priority=priority, cost=cost, resource=resource).result()
+
+    async def run_async(self, fn, *args, priority=INTERACTIVE, cost=1, resource=None):
+        """Submit and await the result from asyncio code"""
+        return await asyncio.wrap_future(self.submit(fn, *args, priority=priority, cost=cost,
+                                                     resource=resource))
+
+    def queue_depth(self):
+        """Number of jobs waiting, per priority name"""
+        with self._cond:
+            depth = collections.Counter(job.priority for _, _, job in self._queue)
+        return {name: depth[priority] for priority, name in PRIORITY_NAMES.items()}
+
+    def stats(self):
+        """Queue depth, running jobs, cores in use and wait-time percentiles per priority"""
+        # Imported here so the scheduler stays cheap to import at startup
+        import numpy as np
+        with self._cond:
+            waits = {priority: list(values) for priority, values in self._waits.items()}
+            running, used = self._running, self._used
+            submitted, completed = dict(self._submitted), dict(self._completed)
+        depth = self.queue_depth()
+
+        priorities = {}
+        for priority, name in PRIORITY_NAMES.items():
+            values = waits[priority]
+            priorities[name] = {
+                'queued': depth[name],
+                'submitted': submitted.get(priority, 0),
+                'completed': completed.get(priority, 0),
+                'wait_p50_ms': float(np.percentile(values, 50)) * 1000 if values else None,
+                'wait_p95_ms': float(np.percentile(values, 95)) * 1000 if values else None,
+            }
+        return {'running': running, 'cores_in_use': used, 'max_cores': self.max_cores,
+                'priorities': priorities}
+
+    def close(self, wait=True):
+        """Stop accepting jobs; queued jobs still run"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _next_job(self):
+        """Pop the job to start now, or return None; call with the lock held"""
+        for entry in sorted(self._queue):
+            job = entry[2]
+            if job.resource is not None and id(job.resource) in self._busy:
+                # Waits for its resource without holding cores or blocking other work
+                continue
+            # Start the head job when its cores are free, or alone if it needs them all
+            if self._used + job.cost <= self.max_cores or self._running == 0:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                return job
+            return None
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    job = self._next_job()
+                    if job is not None:
+                        break
+                    if self._closed and not self._queue:
+                        return
+                    self._cond.wait()
+                if job.resource is not None:
+                    self._busy.add(id(job.resource))
+                self._used += job.cost
+                self._running += 1
+                waited = time.perf_counter() - job.queued_at
+                self._waits[job.priority].append(waited)
+
+            if job.trace is not None:
+                job.trace.add('scheduler_wait', job.queued_at)
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    try:
+                        if job.trace is not None:
+                            with job.trace.activate():
+                                result = job.fn(*job.args)
+                        else:
+                            result = job.fn(*job.args)
+                    except BaseException as e:
+                        job.future.set_exception(e)
+                    else:
+                        job.future.set_result(result)
+            finally:
+                with self._cond:
+                    if job.resource is not None:
+                        self._busy.discard(id(job.resource))
+                    self._used -= job.cost
+                    self._running -= 1
+                    self._completed[job.priority] += 1
+                    self._cond.notify_all()
+
+
+class ScheduledBackend(Backend):
+    """Backend adapter that runs every call through a Scheduler at one priority"""
+    def __init__(self, backend, scheduler, priority=INTERACTIVE):
+        self.backend = backend
+        self.scheduler = scheduler
+        self.priority = priority
+        self.capabilities = backend.capabilities
+        self.kind = backend.kind
+        # A backend that serves one call at a time is run one job at a time
+        self._resource = None if self.capabilities.concurrent else backend
+
+    def with_priority(self, priority):
+        """Another view of the same backend submitting at a different priority"""
+        return ScheduledBackend(self.backend, self.scheduler, priority)
+
+    def transcribe_segments(self, audio_data):
+        return self.scheduler.run(self.backend.transcribe_segments, audio_data,
+                                  priority=self.priority, cost=self.capabilities.threads,
+                                  resource=self._resource)
+
+    def transcribe(self, audio_data):
+        return self.scheduler.run(self.backend.transcribe, audio_data,
+                                  priority=self.priority, cost=self.capabilities.threads,
+                                  resource=self._resource)
+
+    async def transcribe_async(self, audio_data):
+        return await self.scheduler.run_async(self.backend.transcribe, audio_data,
+                                              priority=self.priority, cost=self.capabilities.threads,
+                                              resource=self._resource)
+
+    async def transcribe_segments_async(self, audio_data):
+        return await self.scheduler.run_async(self.backend.transcribe_segments, audio_data,
+                                              priority=self.priority, cost=self.capabilities.threads,
+                                              resource=self._resource)
+
+    def warm_up(self, seconds=2.0, sample_rate=16000):
+        self.scheduler.run(self.backend.warm_up, seconds, sample_rate,
+                           priority=self.priority, cost=self.capabilities.threads,
+                           resource=self._resource)
+
+    def close(self):
+        self.backend.close()
@@ -0,0 +1,85 @@
+import re
+from dataclasses import dataclass
+
+# A bracketed or parenthesised annotation, e.g. [BLANK_AUDIO], [Music] or ( inaudible )
+ANNOTATION = re.compile(r'[\[(]\s*_?[A-Za-z][\w ]*?\s*[\])]')
+# Annotations that mark non-speech wherever they appear, compared lowercase with
+# underscores as spaces; others are removed only when they make up a whole
+# segment, so "the [sic] value" or "call foo(bar)" survive
+NON_SPEECH_TAGS = frozenset({
+    'blank audio', 'silence', 'music', 'music playing', 'upbeat music', 'inaudible',
+    'noise', 'background noise', 'applause', 'laughter', 'laughs', 'laughing',
+    'cough', 'coughing', 'sigh', 'sighs', 'sound', 'no speech', 'static', 'beep',
+    'clapping', 'crosstalk', 'indistinct', 'unintelligible', 'speaking in foreign language',
+})
+# whisper.cpp stdout lines: [00:00:01.000 --> 00:00:02.500]   text
+STDOUT_LINE = re.compile(r'^\[(\d+):(\d+):(\d+)[.,](\d+) --> (\d+):(\d+):(\d+)[.,](\d+)\]\s?(.*)$',
+                         re.MULTILINE)
+
+
+@dataclass
+class Segment:
+    """One transcribed segment; times are seconds from the start of the audio"""
+    start: float
+    end: float
+    text: str
+    confidence: float = None
+
+
+def is_non_speech(annotation):
+    """Whether a matched annotation is a non-speech marker rather than transcript text"""
+    inner = annotation[1:-1].strip()
+    # whisper's own special tokens are upper case in square brackets
+    if annotation[0] == '[' and inner.isupper():
+        return True
+    return ' '.join(inner.replace('_', ' ').lower().split()) in NON_SPEECH_TAGS
+
+
+def clean_segments(segments):
+    """Strip non-speech markers and drop segments left without text"""
+    cleaned = []
+    for segment in segments:
+        text = segment.text
+        if '[' in text or '(' in text:
+            if ANNOTATION.sub('', text).strip():
+                text = ANNOTATION.sub(lambda m: ' ' if is_non_speech(m.group()) else m.group(), text)
+                text = ' '.join(text.split())
+            else:
+                # Nothing but annotations, e.g. "(speaking in foreign language)"
+                text = ''
+        text = text.strip()
+        if text:
+            if text != segment.text:
+                segment = Segment(segment.start, segment.end, text, segment.confidence)
+            cleaned.append(segment)
+    return cleaned
+
+
+def parse_timestamped_lines(output):
+    """Parse whisper.cpp's timestamped stdout into segments without confidence"""
+    segments = []
+    for match in STDOUT_LINE.finditer(output):
+        h0, m0, s0, ms0, h1, m1, s1, ms1 = (int(g) for g in match.groups()[:8])
+        segments.append(Segment(h0 * 3600 + m0 * 60 + s0 + ms0 / 1000,
+                                h1 * 3600 + m1 * 60 + s1 + ms1 / 1000,
+                                match.group(9).strip()))
+    return segments
+
+
+def join_segments(segments):
+    """Join segment texts into a single transcription in one pass"""
+    return ' '.join(text for text in (s.text.strip() for s in segments) if text)
+
+
+def srt_timestamp(seconds):
+    """Format seconds as an SRT timestamp, HH:MM:SS,mmm"""
+    millis = int(round(max(0.0, seconds) * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
+
+
+def srt_cue(index, segment):
+    """Format one segment as a numbered SRT cue"""
+    return f"{index}\n{srt_timestamp(segment.start)} --> {srt_timestamp(segment.end)}\n{segment.text.strip()}\n\n"
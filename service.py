@@ -0,0 +1,495 @@
+"""Local transcription service.
+
+Lets editor plugins and scripts reuse a warm model over HTTP on localhost (or
+a Unix socket) instead of loading their own:
+
+    POST /transcribe    WAV or raw PCM body -> JSON with text and segments
+    POST /stream        chunked upload of WAV or raw PCM -> NDJSON results as audio arrives
+    GET  /health        liveness and queue occupancy
+    GET  /stats         request counters, latency and scheduler metrics
+
+Raw PCM is described by query parameters: rate (default 16000), channels
+(default 1) and format (s16le or f32le). ?priority=batch queues the request
+behind API traffic. Standalone:
+
+    python service.py --backend server --model whisper.cpp/models/ggml-base.en.bin --port 8765
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+import numpy as np
+from audio_buffer import AudioBuffer
+from audio_files import decode_pcm, parse_wav_header, SAMPLE_RATE
+from longform import chunk_ranges, iter_chunks
+from resample import PolyphaseResampler
+from segments import Segment, clean_segments, join_segments
+from vad import speech_mask
+
+DEFAULT_PORT = 8765
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           411: 'Length Required', 413: 'Payload Too Large', 500: 'Internal Server Error',
+           503: 'Service Unavailable'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class PcmStreamDecoder:
+    """Turns an upload of WAV or raw PCM bytes into 16 kHz mono float32, piece by piece"""
+    def __init__(self, rate=SAMPLE_RATE, channels=1, sample_format='s16le', wav=None,
+                 sample_rate=SAMPLE_RATE):
+        if sample_format not in ('s16le', 'f32le'):
+            raise HttpError(400, f"Unsupported format: {sample_format}")
+        self.sample_rate = sample_rate
+        self.rate = rate
+        self.channels = channels
+        self.width = 4 if sample_format == 'f32le' else 2
+        self.float_samples = sample_format == 'f32le'
+        # None: decide from the first bytes whether this is a WAV stream
+        self.wav = wav
+        self._header = b''
+        self._pending = b''
+        self._resampler = None
+
+    def feed(self, data):
+        """Decode the next piece of the upload; returns the new samples"""
+        if self.wav is not False and self._resampler is None:
+            self._header += data
+            if self.wav is None and len(self._header) >= 4:
+                self.wav = self._header[:4] == b'RIFF'
+            if self.wav:
+                try:
+                    header = parse_wav_header(self._header)
+                except ValueError as e:
+                    raise HttpError(400, str(e))
+                if header is None:
+                    return np.empty(0, dtype=np.float32)
+                self.rate, self.channels, self.width, offset = header
+                data = self._header[offset:]
+            elif self.wav is None:
+                return np.empty(0, dtype=np.float32)
+            else:
+                data = self._header
+            self._header = b''
+
+        if self._resampler is None:
+            self._resampler = (PolyphaseResampler(self.rate, self.sample_rate)
+                               if self.rate != self.sample_rate else False)
+
+        # Only whole frames are decoded; the remainder waits for the next piece
+        data = self._pending + data
+        frame = self.width * self.channels
+        usable = len(data) - len(data) % frame
+        self._pending = data[usable:]
+        audio = decode_pcm(data[:usable], self.sample_rate, self.width, self.channels,
+                           self.sample_rate, float_samples=self.float_samples)
+        if self._resampler:
+            audio = self._resampler.process(audio).copy()
+        return audio
+
+    def finish(self):
+        """Samples still held back by the resampler at the end of the upload"""
+        if self._header and not self.wav:
+            # Fewer than four bytes of raw PCM in total
+            data, self._header, self.wav = self._header, b'', False
+            tail = self.feed(data)
+        else:
+            tail = np.empty(0, dtype=np.float32)
+        if self._resampler:
+            return np.concatenate((tail, self._resampler.flush()))
+        return tail
+
+
+class TranscriptionService:
+    """asyncio HTTP server that transcribes uploads with a shared, already-warm backend"""
+    def __init__(self, backend, batch_backend=None, host='127.0.0.1', port=DEFAULT_PORT,
+                 unix_path=None, max_pending=8, max_body_bytes=256 * 1024 * 1024,
+                 chunk_seconds=10.0, stats=None, sample_rate=SAMPLE_RATE, postprocess=None):
+        # Anything with transcribe_segments(audio); calls block, so they run in threads
+        self.backend = backend
+        self.batch_backend = batch_backend or backend
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        # Requests beyond this many in progress are turned away with 503
+        self.max_pending = max_pending
+        self.max_body_bytes = max_body_bytes
+        # Streaming uploads get a result about every chunk_seconds of audio
+        self.chunk_seconds = chunk_seconds
+        self.extra_stats = stats
+        self.sample_rate = sample_rate
+        # PostProcessor for the returned text; segments keep the model's words
+        self.postprocess = postprocess
+
+        self.pending = 0
+        self.counts = collections.Counter()
+        self._latencies = collections.deque(maxlen=1000)
+        self._server = None
+        self._loop = None
+        self._thread = None
+
+    @property
+    def address(self):
+        return self.unix_path or f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        """Bind the socket and start accepting connections"""
+        if self.unix_path:
+            if os.path.exists(self.unix_path):
+                os.remove(self.unix_path)
+            self._server = await asyncio.start_unix_server(self._handle, path=self.unix_path)
+        else:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            # Port 0 picks a free port
+            self.port = self._server.sockets[0].getsockname()[1]
+        print(f"Transcription service listening on {self.address}")
+
+    async def serve(self):
+        """Start and serve until cancelled"""
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start_in_thread(self):
+        """Run the service on its own event loop thread, e.g. beside the Qt app"""
+        started = threading.Event()
+        error = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._loop.run_until_complete(self.start())
+            except Exception as e:
+                error.append(e)
+                started.set()
+                return
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._close_server())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True, name='transcription-service')
+        self._thread.start()
+        started.wait()
+        if error:
+            raise error[0]
+
+    def stop(self):
+        """Stop a service started with start_in_thread()"""
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    async def _close_server(self):
+        self._server.close()
+        await self._server.wait_closed()
+        if self.unix_path and os.path.exists(self.unix_path):
+            os.remove(self.unix_path)
+
+    def stats(self):
+        """Request counters, current occupancy and latency percentiles"""
+        latencies = list(self._latencies)
+        stats = {
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'requests': dict(self.counts),
+            'latency_p50_ms': float(np.percentile(latencies, 50)) * 1000 if latencies else None,
+            'latency_p95_ms': float(np.percentile(latencies, 95)) * 1000 if latencies else None,
+        }
+        if self.extra_stats:
+            stats['scheduler'] = self.extra_stats()
+        return stats
+
+    async def _handle(self, reader, writer):
+        """Serve one request per connection"""
+        try:
+            method, path, query, headers = await self._read_head(reader)
+            if path in ('/health', '/stats'):
+                if method != 'GET':
+                    raise HttpError(405, "Use GET")
+                body = ({'status': 'ok', 'pending': self.pending, 'max_pending': self.max_pending}
+                        if path == '/health' else self.stats())
+                await self._respond(writer, 200, body)
+            elif path in ('/transcribe', '/stream'):
+                if method != 'POST':
+                    raise HttpError(405, "Use POST")
+                await self._admit(writer, path, query, headers, reader)
+            else:
+                raise HttpError(404, f"No such endpoint: {path}")
+        except HttpError as e:
+            self.counts[str(e.status)] += 1
+            await self._respond(writer, e.status, {'error': str(e)},
+                                {'Retry-After': '1'} if e.status == 503 else None)
+            await self._linger(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"Transcription service error: {e}")
+            self.counts['500'] += 1
+            try:
+                await self._respond(writer, 500, {'error': str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def _admit(self, writer, path, query, headers, reader):
+        """Apply the pending-request bound, then run the endpoint"""
+        if self.pending >= self.max_pending:
+            raise HttpError(503, "Too many requests in progress")
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            if headers.get('expect', '').lower() == '100-continue':
+                writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            backend = self.batch_backend if query.get('priority') == 'batch' else self.backend
+            decoder = self._decoder(query, headers)
+            body = self._read_body(reader, headers)
+            if path == '/transcribe':
+                await self._transcribe(writer, backend, decoder, body)
+            else:
+                await self._stream(writer, backend, decoder, body)
+            self.counts['200'] += 1
+            self._latencies.append(time.perf_counter() - start)
+        finally:
+            self.pending -= 1
+
+    async def _transcribe(self, writer, backend, decoder, body):
+        """POST /transcribe: read the whole upload, answer with one JSON document"""
+        buffer = AudioBuffer(sample_rate=self.sample_rate)
+        async for piece in body:
+            buffer.write(decoder.feed(piece))
+        buffer.write(decoder.finish())
+        audio = buffer.view()
+        if len(audio) == 0:
+            raise HttpError(400, "No audio in request body")
+
+        start = time.perf_counter()
+        segments = await self._segments(backend, audio, 0)
+        text = join_segments(segments)
+        if self.postprocess is not None:
+            text = self.postprocess.process(text)
+        await self._respond(writer, 200, {
+            'text': text,
+            'segments': [_segment_dict(s) for s in segments],
+            'audio_seconds': len(audio) / self.sample_rate,
+            'seconds': time.perf_counter() - start,
+        })
+
+    async def _stream(self, writer, backend, decoder, body):
+        """POST /stream: transcribe pause-aligned chunks while the upload continues"""
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n'
+                     b'Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n')
+        buffer = AudioBuffer(sample_rate=self.sample_rate)
+        window = int(2 * self.chunk_seconds * self.sample_rate)
+        position = 0
+        texts = []
+        # Rules are applied as text arrives, holding back words that may start a phrase
+        rules = self.postprocess.stream() if self.postprocess is not None else None
+
+        async def emit(offset, audio):
+            segments = await self._segments(backend, audio, offset)
+            if segments:
+                text = join_segments(segments)
+                texts.append(rules.feed(text) if rules else text)
+                await _write_chunk(writer, {
+                    'type': 'partial',
+                    'start': round(offset / self.sample_rate, 3),
+                    'end': round((offset + len(audio)) / self.sample_rate, 3),
+                    'text': texts[-1],
+                    'segments': [_segment_dict(s) for s in segments],
+                })
+
+        try:
+            async for piece in body:
+                buffer.write(decoder.feed(piece))
+                # Commit a chunk as soon as a pause past chunk_seconds has arrived
+                while len(buffer) - position >= window:
+                    view = buffer.view(position, position + window)
+                    cut = chunk_ranges(view, self.sample_rate, self.chunk_seconds)[0][1]
+                    await emit(position, view[:cut])
+                    position += cut
+            buffer.write(decoder.finish())
+            for offset, chunk in iter_chunks(buffer.view(position), self.sample_rate, self.chunk_seconds):
+                await emit(position + offset, chunk)
+            if rules:
+                texts.append(rules.finish())
+                final = ''.join(texts)
+            else:
+                final = ' '.join(texts)
+            await _write_chunk(writer, {'type': 'final', 'text': final,
+                                        'audio_seconds': len(buffer) / self.sample_rate})
+        except HttpError as e:
+            await _write_chunk(writer, {'type': 'error', 'error': str(e)})
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def _segments(self, backend, audio, offset):
+        """Transcribe one piece of audio off the event loop, skipping silence"""
+        mask, _ = speech_mask(audio, self.sample_rate)
+        if not mask.any():
+            return []
+        segments = await asyncio.to_thread(backend.transcribe_segments, audio)
+        start = offset / self.sample_rate
+        return [Segment(s.start + start, s.end + start, s.text, s.confidence)
+                for s in clean_segments(segments)]
+
+    def _decoder(self, query, headers):
+        content_type = headers.get('content-type', '').split(';')[0].strip().lower()
+        wav = True if content_type in ('audio/wav', 'audio/x-wav', 'audio/wave') else None
+        try:
+            return PcmStreamDecoder(int(query.get('rate', SAMPLE_RATE)), int(query.get('channels', 1)),
+                                    query.get('format', 's16le'), wav=wav, sample_rate=self.sample_rate)
+        except ValueError:
+            raise HttpError(400, "rate and channels must be integers")
+
+    @staticmethod
+    async def _read_head(reader):
+        """Parse the request line and headers"""
+        line = await reader.readline()
+        try:
+            method, target, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        url = urllib.parse.urlsplit(target)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        return method.upper(), url.path, query, headers
+
+    async def _read_body(self, reader, headers):
+        """Yield the request body in pieces, from Content-Length or chunked encoding"""
+        received = 0
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            while True:
+                size_line = await reader.readline()
+                try:
+                    size = int(size_line.split(b';')[0].strip(), 16)
+                except ValueError:
+                    raise HttpError(400, "Malformed chunk size")
+                if size == 0:
+                    # Skip optional trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                received += size
+                if received > self.max_body_bytes:
+                    raise HttpError(413, "Upload too large")
+                data = await reader.readexactly(size)
+                await reader.readexactly(2)
+                yield data
+        elif 'content-length' in headers:
+            remaining = int(headers['content-length'])
+            if remaining > self.max_body_bytes:
+                raise HttpError(413, "Upload too large")
+            while remaining:
+                data = await reader.read(min(remaining, 256 * 1024))
+                if not data:
+                    raise HttpError(400, "Body shorter than Content-Length")
+                remaining -= len(data)
+                yield data
+        else:
+            raise HttpError(411, "Send Content-Length or chunked encoding")
+
+    @staticmethod
+    async def _linger(reader, writer, timeout=2.0):
+        """Discard the rest of an unread upload so closing doesn't reset the connection
+
+        Closing with request bytes still unread makes the kernel send a reset,
+        which can destroy the error response before the client reads it.
+        """
+        if writer.can_write_eof():
+            writer.write_eof()
+        try:
+            await asyncio.wait_for(_read_to_eof(reader), timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+
+    @staticmethod
+    async def _respond(writer, status, body, extra_headers=None):
+        data = json.dumps(body).encode('utf-8')
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                "Content-Type: application/json",
+                f"Content-Length: {len(data)}",
+                "Connection: close"]
+        head += [f"{name}: {value}" for name, value in (extra_headers or {}).items()]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + data)
+        await writer.drain()
+
+
+def _segment_dict(segment):
+    return {'start': round(segment.start, 3), 'end': round(segment.end, 3),
+            'text': segment.text, 'confidence': segment.confidence}
+
+
+async def _read_to_eof(reader):
+    while await reader.read(256 * 1024):
+        pass
+
+
+async def _write_chunk(writer, item):
+    """Send one NDJSON line as an HTTP chunk"""
+    data = (json.dumps(item) + '\n').encode('utf-8')
+    writer.write(f"{len(data):x}\r\n".encode('latin-1') + data + b'\r\n')
+    await writer.drain()
+
+
+def parse_args(argv=None):
+    from backends import BACKEND_KINDS
+    parser = argparse.ArgumentParser(description="Serve transcription over local HTTP")
+    parser.add_argument('--backend', choices=BACKEND_KINDS, default='auto')
+    parser.add_argument('--exe', help="whisper.cpp (or stub) executable for the backend")
+    parser.add_argument('--model', default=os.path.join('whisper.cpp', 'models', 'ggml-base.en.bin'))
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--max-pending', type=int, default=8)
+    parser.add_argument('--rules', metavar='PATH', help="text rules file applied to results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from backends import create_backend
+    from scheduler import Scheduler, ScheduledBackend, API, BATCH
+    args = parse_args(argv)
+    scheduler = Scheduler()
+    # Segments in responses carry a confidence
+    backend = create_backend(args.model, kind=args.backend, n_threads=args.threads, exe_path=args.exe,
+                             confidence=True)
+    backend.warm_up()
+    api = ScheduledBackend(backend, scheduler, API)
+    postprocess = None
+    if args.rules:
+        from postprocess import PostProcessor
+        postprocess = PostProcessor(args.rules)
+    service = TranscriptionService(api, api.with_priority(BATCH), host=args.host, port=args.port,
+                                   unix_path=args.unix, max_pending=args.max_pending,
+                                   stats=scheduler.stats, postprocess=postprocess)
+    try:
+        asyncio.run(service.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.close(wait=False)
+        backend.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
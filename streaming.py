@@ -0,0 +1,105 @@
+import re
+import threading
+from vad import trim_silence
+
+_NORMALIZE = re.compile(r"[^\w']+")
+
+
+def _normalize(word):
+    """Lowercase a word and strip punctuation for overlap comparison"""
+    return _NORMALIZE.sub('', word.lower())
+
+
+def merge_overlap(committed, new_words, max_overlap=8, max_skip=2):
+    """Append new_words to committed, dropping words repeated from the window overlap"""
+    if not committed:
+        committed.extend(new_words)
+        return committed
+
+    norm_committed = [_normalize(w) for w in committed[-(max_overlap + 1):]]
+    norm_new = [_normalize(w) for w in new_words[:max_overlap + max_skip]]
+
+    # Prefer the longest run of words shared by the end of the committed text
+    # and the start of the new window. The last committed word may have been
+    # cut mid-word at the window edge, so also try matching without it.
+    for k in range(min(max_overlap, len(norm_new)), 0, -1):
+        for trim in (0, 1):
+            tail = norm_committed[len(norm_committed) - k - trim:len(norm_committed) - trim]
+            if len(tail) != k:
+                continue
+            for skip in range(0, max_skip + 1):
+                if norm_new[skip:skip + k] == tail:
+                    if trim:
+                        committed.pop()
+                    committed.extend(new_words[skip + k:])
+                    return committed
+
+    committed.extend(new_words)
+    return committed
+
+
+class StreamingTranscriber:
+    """Transcribes overlapping windows of a recording while it is still being captured"""
+    def __init__(self, whisper, buffer, window_seconds=8.0, overlap_seconds=1.5):
+        self.whisper = whisper
+        # AudioBuffer being filled by the recorder; windows are read as zero-copy views
+        self.buffer = buffer
+        self.sample_rate = buffer.sample_rate
+        self.window = int(window_seconds * self.sample_rate)
+        self.overlap = int(overlap_seconds * self.sample_rate)
+
+        self._wake = threading.Event()
+        self._finished = False
+        self._next_start = 0  # Sample index where the next window begins
+        self._words = []
+        self._error = None
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """Signal that new audio is available; safe to call from the audio callback"""
+        self._wake.set()
+
+    def finish(self):
+        """Transcribe the remaining tail and return the full deduplicated text"""
+        self._finished = True
+        self._wake.set()
+        self._thread.join()
+        if self._error:
+            raise self._error
+
+        # Only the audio after the last full window is left to process
+        end = len(self.buffer)
+        if end - self._next_start > self.overlap or not self._words:
+            self._transcribe_window(self._next_start, end)
+
+        return ' '.join(self._words)
+
+    @property
+    def text(self):
+        """Text committed so far"""
+        return ' '.join(self._words)
+
+    def _run(self):
+        """Background loop that transcribes each window once enough audio has arrived"""
+        try:
+            while not self._finished:
+                self._wake.wait()
+                self._wake.clear()
+                while not self._finished and len(self.buffer) - self._next_start >= self.window:
+                    self._transcribe_window(self._next_start, self._next_start + self.window)
+                    self._next_start += self.window - self.overlap
+        except Exception as e:
+            print(f"Error during streaming transcription: {e}")
+            self._error = e
+
+    def _transcribe_window(self, start, end):
+        """Transcribe one window and commit its text"""
+        # Skip windows that are all silence and trim the edges of the rest
+        vad = trim_silence(self.buffer.view(start, end), self.sample_rate)
+        if not vad.has_speech:
+            return
+        text = self.whisper.transcribe(vad.audio)
+        print(f"Streaming window {start / self.sample_rate:.1f}s-{end / self.sample_rate:.1f}s: '{text}'")
+        merge_overlap(self._words, text.split())
@@ -1,91 +1,311 @@
 import subprocess
-import tempfile
 import os
-import wave
-import numpy as np
-import re
+import json
+import math
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+import urllib.request
+import urllib.error
+from pcm import SAMPLE_RATE, encode_wav
+from segments import Segment, clean_segments, join_segments, parse_timestamped_lines
+from backends import Backend, Capabilities
+from tracing import span
+
+# Executable names used by the different whisper.cpp release layouts
+CLI_EXE_NAMES = ['main.exe', 'whisper-cli.exe', 'main', 'whisper-cli']
+SERVER_EXE_NAMES = ['whisper-server.exe', 'server.exe', 'whisper-server', 'server']
+
+
+def find_whisper_executable(names):
+    """Return the first whisper.cpp executable found next to this file, or None"""
+    base_dir = os.path.dirname(__file__)
+    for folder in (base_dir, os.path.join(base_dir, 'whisper-precompiled')):
+        for name in names:
+            path = os.path.join(folder, name)
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def is_server_executable(path):
+    """Whether a whisper.cpp executable is the HTTP server rather than the CLI"""
+    name = os.path.basename(path).lower()
+    return name in SERVER_EXE_NAMES or 'server' in name
 
-class SubprocessWhisper:
-    def __init__(self, model_path):
+
+class SubprocessWhisper(Backend):
+    kind = 'subprocess'
+
+    def __init__(self, model_path, exe_path=None, n_threads=4, confidence=False):
         self.model_path = model_path
-        # Check if main.exe exists in the extracted directory
-        self.exe_path = os.path.join(os.path.dirname(__file__), 'main.exe')
-        if not os.path.exists(self.exe_path):
-            # Look in other common locations
-            alt_path = os.path.join(os.path.dirname(__file__), 'whisper-precompiled', 'main.exe')
-            if os.path.exists(alt_path):
-                self.exe_path = alt_path
-        
+        self.n_threads = n_threads
+        # Check if main.exe exists in the extracted directory or other common locations
+        self.exe_path = (exe_path
+                         or find_whisper_executable(CLI_EXE_NAMES)
+                         or os.path.join(os.path.dirname(__file__), 'main.exe'))
+        self._output_dir = tempfile.mkdtemp(prefix='whisper-')
+        # Token confidences only come in whisper.cpp's JSON output, which it can
+        # only write to a file; that disk round-trip per call is paid only when
+        # confidence is asked for, otherwise the printed lines are parsed. Builds
+        # that don't know -ojf reject it before transcribing, so ask once up front.
+        self.json_output = confidence and supports_json_output(self.exe_path)
+        # Every call is its own process, so calls can overlap freely
+        self.capabilities = Capabilities(timestamps=True, confidence=self.json_output,
+                                         concurrent=True, threads=n_threads)
+
         print(f"Using whisper executable at: {self.exe_path}")
-        
+        if confidence and not self.json_output:
+            print("This whisper.cpp build has no JSON output; segments will have no confidence")
+
     def transcribe(self, audio_data):
-        # Save audio data to a temporary WAV file
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-            temp_filename = temp_file.name
-        
-        # Write audio data to WAV file
-        with wave.open(temp_filename, 'wb') as wav_file:
-            wav_file.setnchannels(1)  # Mono
-            wav_file.setsampwidth(2)  # 16-bit
-            wav_file.setframerate(16000)  # 16kHz
-            # Convert float32 audio to int16
-            audio_int16 = (audio_data * 32767).astype(np.int16)
-            wav_file.writeframes(audio_int16.tobytes())
-        
         try:
-            # Call the whisper.cpp executable with the temp file
-            cmd = [
-                self.exe_path,
-                '-m', self.model_path,
-                '-f', temp_filename,
-                '-t', '4'  # Use 4 threads
-            ]
-            print(f"Running command: {' '.join(cmd)}")
-            
-            # Run the command and capture output
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            # Extract transcribed text from output
-            if result.returncode == 0:
-                # Print the original output for debugging
-                print("Original whisper.cpp output:")
-                print(result.stdout)
-                
-                # Process all lines with timestamps
-                output_lines = result.stdout.split('\n')
-                transcription = ""
-                
-                # Process each line for timestamps
-                for line in output_lines:
-                    # Look for timestamp pattern
-                    if '[' in line and ' --> ' in line and ']' in line:
-                        # Extract text after the timestamp
-                        parts = line.split(']')
-                        if len(parts) > 1:
-                            text = parts[1].strip()
-                            # Skip blank audio markers
-                            if "[BLANK_AUDIO]" in text:
-                                text = text.replace("[BLANK_AUDIO]", "").strip()
-                            # Only add non-empty text
-                            if text:
-                                transcription += text + " "
-                
-                # Clean up the transcription
-                # Remove any remaining special tags or markers
-                clean_transcription = re.sub(r'\[.*?\]', '', transcription).strip()
-                # Remove any stray bracket characters that might remain
-                clean_transcription = clean_transcription.replace('[', '').replace(']', '')
-                
-                # Print the extracted transcription for debugging
-                print(f"Extracted transcription: '{clean_transcription}'")
-                
-                return clean_transcription
-            else:
-                print(f"Error running whisper.cpp: {result.stderr}")
-                return f"Error: {result.stderr}"
+            segments = self.transcribe_segments(audio_data)
+        except RuntimeError as e:
+            return f"Error: {e}"
+        transcription = join_segments(clean_segments(segments))
+        print(f"Extracted transcription: '{transcription}'")
+        return transcription
+
+    def transcribe_segments(self, audio_data):
+        """Run whisper.cpp on float32 audio and return its segments"""
+        # Stream the audio to whisper.cpp as an in-memory WAV on stdin
+        with span('wav_encode'):
+            wav_bytes = encode_wav(audio_data)
+
+        cmd = [
+            self.exe_path,
+            '-m', self.model_path,
+            '-f', '-',
+            '-t', str(self.n_threads)
+        ]
+        # Ask for full JSON output (segments with token probabilities) in a
+        # private folder; each call gets its own file name so calls can overlap
+        output_base = os.path.join(self._output_dir, uuid.uuid4().hex)
+        if self.json_output:
+            cmd += ['-ojf', '-of', output_base]
+        print(f"Running command: {' '.join(cmd)}")
+
+        # Run the command and capture output; this covers process spawn,
+        # model load and inference, which can't be told apart from outside
+        with span('whisper_process'):
+            result = subprocess.run(cmd, input=wav_bytes, capture_output=True)
+
+        json_path = output_base + '.json'
+        try:
+            if result.returncode != 0:
+                stderr = result.stderr.decode('utf-8', errors='replace')
+                print(f"Error running whisper.cpp: {stderr}")
+                raise RuntimeError(stderr)
+
+            with span('parse_output'):
+                if os.path.exists(json_path):
+                    with open(json_path, 'rb') as f:
+                        # Token text can split multi-byte characters
+                        return parse_json_output(json.loads(f.read().decode('utf-8', errors='replace')))
+                # Without JSON output the segments come from the printed lines
+                return parse_timestamped_lines(result.stdout.decode('utf-8', errors='replace'))
         finally:
-            # Clean up the temporary file
+            if os.path.exists(json_path):
+                os.remove(json_path)
+
+    def close(self):
+        """Remove the folder whisper.cpp writes its output files to"""
+        shutil.rmtree(self._output_dir, ignore_errors=True)
+
+    def __del__(self):
+        if getattr(self, '_output_dir', None):
+            self.close()
+
+
+def supports_json_output(exe_path):
+    """Whether a whisper.cpp CLI build accepts -ojf, going by its usage text"""
+    try:
+        result = subprocess.run([exe_path, '-h'], capture_output=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        # A missing executable fails properly on the first transcription
+        return False
+    usage = (result.stdout + result.stderr).decode('utf-8', errors='replace')
+    return '-ojf' in usage
+
+
+def parse_json_output(data):
+    """Convert whisper.cpp's -ojf JSON document into segments"""
+    segments = []
+    for item in data.get('transcription', []):
+        offsets = item.get('offsets', {})
+        segments.append(Segment(offsets.get('from', 0) / 1000, offsets.get('to', 0) / 1000,
+                                item.get('text', '').strip(),
+                                _mean_probability(item.get('tokens', []), 'p')))
+    return segments
+
+
+def parse_verbose_json(data):
+    """Convert a whisper.cpp server verbose_json response into segments"""
+    if 'segments' not in data:
+        # Servers that ignore verbose_json only return the text
+        return [Segment(0.0, 0.0, data.get('text', '').strip())]
+
+    segments = []
+    for item in data['segments']:
+        confidence = _mean_probability(item.get('words', []), 'probability')
+        if confidence is None and item.get('avg_logprob') is not None:
+            confidence = math.exp(item['avg_logprob'])
+        segments.append(Segment(item.get('start', 0.0), item.get('end', 0.0),
+                                item.get('text', '').strip(), confidence))
+    return segments
+
+
+def _mean_probability(items, key):
+    """Mean of the probabilities in a list of token or word records, or None"""
+    values = [item[key] for item in items if item.get(key) is not None]
+    return sum(values) / len(values) if values else None
+
+
+class PersistentWhisper(Backend):
+    """Keeps one whisper.cpp server process alive so the model stays resident"""
+    kind = 'server'
+
+    def __init__(self, model_path, server_path=None, n_threads=4, startup_timeout=30.0,
+                 request_timeout=30.0, timeout_per_second=3.0):
+        self.model_path = model_path
+        self.n_threads = n_threads
+        self.capabilities = Capabilities(timestamps=True, confidence=True, persistent=True,
+                                         threads=n_threads)
+        self.startup_timeout = startup_timeout
+        # A request may take a fixed allowance plus this much per second of
+        # audio before the server is taken to be hung
+        self.request_timeout = request_timeout
+        self.timeout_per_second = timeout_per_second
+        # The server binary can be swapped for a stub worker in tests
+        self.server_path = server_path or find_whisper_executable(SERVER_EXE_NAMES)
+        if not self.server_path:
+            raise FileNotFoundError("whisper.cpp server executable not found")
+
+        self.process = None
+        self.port = None
+        self._lock = threading.Lock()
+
+        print(f"Using whisper server executable at: {self.server_path}")
+        self.start()
+
+    def start(self):
+        """Launch the server process and wait until it accepts connections"""
+        self.port = self._free_port()
+        cmd = [
+            self.server_path,
+            '-m', self.model_path,
+            '-t', str(self.n_threads),
+            '--host', '127.0.0.1',
+            '--port', str(self.port)
+        ]
+        print(f"Starting whisper server: {' '.join(cmd)}")
+        self.process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        # The model is loaded before the server starts listening, so a
+        # successful connect means the worker is warm
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"whisper server exited with code {self.process.returncode}")
             try:
-                os.remove(temp_filename)
-            except:
-                pass
+                with socket.create_connection(('127.0.0.1', self.port), timeout=0.5):
+                    print(f"Whisper server ready on port {self.port}")
+                    return
+            except OSError:
+                time.sleep(0.05)
+
+        self.close()
+        raise RuntimeError("Timed out waiting for whisper server to start")
+
+    def is_alive(self):
+        """Check whether the server process is still running"""
+        return self.process is not None and self.process.poll() is None
+
+    def transcribe(self, audio_data):
+        transcription = join_segments(clean_segments(self.transcribe_segments(audio_data)))
+        print(f"Extracted transcription: '{transcription}'")
+        return transcription
+
+    def transcribe_segments(self, audio_data):
+        """Send float32 audio to the server and return its segments"""
+        with self._lock:
+            with span('wav_encode'):
+                wav_bytes = encode_wav(audio_data)
+
+            # Restart the worker if it died since the last request
+            if not self.is_alive():
+                print("Whisper server is not running - restarting")
+                with span('server_restart'):
+                    self.start()
+
+            timeout = self.request_timeout + self.timeout_per_second * len(audio_data) / SAMPLE_RATE
+            try:
+                with span('server_inference'):
+                    response = self._post_inference(wav_bytes, timeout)
+            except (urllib.error.URLError, ConnectionError, socket.timeout) as e:
+                # The worker may have crashed or hung mid-request; retry once on a fresh process
+                print(f"Whisper server request failed ({e}) - restarting")
+                with span('server_restart'):
+                    self.close()
+                    self.start()
+                try:
+                    with span('server_inference'):
+                        response = self._post_inference(wav_bytes, timeout)
+                except socket.timeout:
+                    # Don't leave a hung worker for the next request to wait on
+                    self.close()
+                    raise
+
+        with span('parse_output'):
+            return parse_verbose_json(response)
+
+    def close(self):
+        """Stop the server process"""
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+    def _post_inference(self, wav_bytes, timeout):
+        """Send one WAV upload to the server's /inference endpoint"""
+        boundary = uuid.uuid4().hex
+        body = b''.join([
+            f'--{boundary}\r\n'.encode(),
+            b'Content-Disposition: form-data; name="file"; filename="audio.wav"\r\n',
+            b'Content-Type: audio/wav\r\n\r\n',
+            wav_bytes,
+            f'\r\n--{boundary}\r\n'.encode(),
+            b'Content-Disposition: form-data; name="response_format"\r\n\r\n',
+            b'verbose_json',
+            f'\r\n--{boundary}--\r\n'.encode()
+        ])
+        request = urllib.request.Request(
+            f'http://127.0.0.1:{self.port}/inference',
+            data=body,
+            headers={'Content-Type': f'multipart/form-data; boundary={boundary}'}
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    @staticmethod
+    def _free_port():
+        """Ask the OS for an unused localhost port"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def __del__(self):
+        if getattr(self, 'process', None) is not None:
+            self.close()
@@ -0,0 +1,63 @@
+import os
+import stat
+import sys
+import textwrap
+import pytest
+
+# The modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Answers every transcription with two timestamped lines, like the whisper.cpp CLI
+CLI_STUB = """
+    import sys
+    sys.stdin.buffer.read()
+    print("[00:00:00.000 --> 00:00:01.000]   hello world")
+"""
+
+# A whisper.cpp server stand-in. The nth start behaves as modes[n] (the last
+# mode repeats): 'ok', 'hang' (never answers) or 'exit' (dies on a request).
+# Each start logs its pid to STARTS.
+SERVER_STUB = """
+    import json, os, sys, time
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    MODES = {modes!r}
+    STARTS = {starts!r}
+    started = open(STARTS).read().split() if os.path.exists(STARTS) else []
+    MODE = MODES[min(len(started), len(MODES) - 1)]
+    with open(STARTS, 'a') as f:
+        f.write(f"{{os.getpid()}}\\n")
+    port = int(sys.argv[sys.argv.index('--port') + 1])
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            if MODE == 'hang':
+                time.sleep(3600)
+            if MODE == 'exit':
+                os._exit(1)
+            body = json.dumps({{'text': ' hello', 'segments': [
+                {{'start': 0.0, 'end': 1.0, 'text': ' hello', 'avg_logprob': -0.1}}]}}).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    HTTPServer(('127.0.0.1', port), Handler).serve_forever()
+"""
+
+
+@pytest.fixture
+def make_stub(tmp_path):
+    """Write an executable Python script standing in for a whisper.cpp binary"""
+    if sys.platform == 'win32':
+        pytest.skip("stub executables rely on a shebang line")
+
+    def make(name, source):
+        path = tmp_path / name
+        path.write_text(f"#!{sys.executable}\n" + textwrap.dedent(source))
+        path.chmod(path.stat().st_mode | stat.S_IEXEC)
+        return str(path)
+    return make
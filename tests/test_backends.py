@@ -0,0 +1,39 @@
+import pytest
+import backends
+import whisper_wrapper
+from subprocess_whisper import PersistentWhisper, SubprocessWhisper
+from conftest import CLI_STUB, SERVER_STUB
+
+
+@pytest.fixture(autouse=True)
+def no_native(monkeypatch):
+    monkeypatch.setattr(whisper_wrapper, 'probe', lambda: (False, "disabled in tests"))
+
+
+def test_auto_uses_explicit_cli_exe(make_stub):
+    exe = make_stub('whisper-cli', CLI_STUB)
+    backend = backends.create_backend('model.bin', kind='auto', exe_path=exe)
+    try:
+        assert isinstance(backend, SubprocessWhisper)
+        assert backend.exe_path == exe
+    finally:
+        backend.close()
+
+
+def test_auto_uses_explicit_server_exe(make_stub, tmp_path):
+    exe = make_stub('whisper-server', SERVER_STUB.format(modes=['ok'], starts=str(tmp_path / 'starts')))
+    backend = backends.create_backend('model.bin', kind='auto', exe_path=exe)
+    try:
+        assert isinstance(backend, PersistentWhisper)
+        assert backend.server_path == exe
+    finally:
+        backend.close()
+
+
+def test_explicit_kinds_use_exe(make_stub, tmp_path):
+    cli = make_stub('whisper-cli', CLI_STUB)
+    server = make_stub('whisper-server', SERVER_STUB.format(modes=['ok'], starts=str(tmp_path / 'starts')))
+    with backends.create_backend('model.bin', kind='subprocess', exe_path=cli) as backend:
+        assert backend.exe_path == cli
+    with backends.create_backend('model.bin', kind='server', exe_path=server) as backend:
+        assert backend.server_path == server
@@ -0,0 +1,23 @@
+import os
+from batch import run_batch
+from pcm import encode_wav
+from audio_files import synthetic_speech
+
+# A whisper.cpp CLI that always fails
+FAILING_CLI_STUB = """
+    import sys
+    sys.stdin.buffer.read()
+    sys.stderr.write('model failed to load\\n')
+    sys.exit(1)
+"""
+
+
+def test_failed_file_leaves_no_partial_outputs(make_stub, tmp_path):
+    audio_path = tmp_path / 'clip.wav'
+    audio_path.write_bytes(encode_wav(synthetic_speech(2.0)))
+    output_dir = tmp_path / 'out'
+    totals = run_batch([str(audio_path)], str(output_dir), ['txt', 'srt', 'jsonl'], 'model.bin',
+                       kind='subprocess', exe_path=make_stub('main', FAILING_CLI_STUB), workers=1)
+    assert totals['failed'] == 1
+    assert not [name for name in os.listdir(output_dir) if name.endswith('.part')]
+    assert not [name for name in os.listdir(output_dir) if name.startswith('clip.')]
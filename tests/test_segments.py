@@ -0,0 +1,28 @@
+import pytest
+from segments import Segment, clean_segments, join_segments
+
+
+def clean(*texts):
+    return join_segments(clean_segments([Segment(0.0, 1.0, text) for text in texts]))
+
+
+@pytest.mark.parametrize('marker', [
+    '[BLANK_AUDIO]', '[MUSIC]', '[Music]', '[MUSIC PLAYING]', '[ Silence ]', '[inaudible]',
+    '(music)', '( Applause )', '[_BEG_]',
+])
+def test_non_speech_markers_are_stripped(marker):
+    assert clean(f"hello {marker} world") == "hello world"
+    assert clean(marker) == ""
+
+
+def test_segment_of_only_annotations_is_dropped():
+    assert clean("hello", "(speaking in foreign language)", "[Door slams] [Music]", "world") == "hello world"
+
+
+@pytest.mark.parametrize('text', [
+    "the [sic] value",
+    "call foo(bar) here",
+    "it was (mostly) fine",
+])
+def test_bracketed_transcript_text_survives(text):
+    assert clean(text) == text
@@ -0,0 +1,105 @@
+import os
+import socket
+import numpy as np
+import pytest
+from subprocess_whisper import PersistentWhisper, SubprocessWhisper
+from conftest import SERVER_STUB
+
+# A CLI that knows -ojf, writes the JSON file it is asked for and logs its arguments
+JSON_CLI_STUB = """
+    import json, sys
+    with open({log!r}, 'a') as f:
+        f.write(' '.join(sys.argv[1:]) + '\\n')
+    if '-h' in sys.argv:
+        sys.stderr.write('  -ojf,     --output-json-full  include more information in the JSON file\\n')
+        sys.exit(0)
+    sys.stdin.buffer.read()
+    if '-ojf' in sys.argv:
+        doc = {{'transcription': [{{'offsets': {{'from': 0, 'to': 1000}}, 'text': ' hello',
+                                    'tokens': [{{'p': 0.5}}]}}]}}
+        with open(sys.argv[sys.argv.index('-of') + 1] + '.json', 'w') as f:
+            json.dump(doc, f)
+    else:
+        print("[00:00:00.000 --> 00:00:01.000]   hello")
+"""
+
+# A CLI from before -ojf: usage without it, and the argument is rejected
+PLAIN_CLI_STUB = """
+    import sys
+    if '-h' in sys.argv:
+        sys.stderr.write('usage: main [options] file0.wav\\n')
+        sys.exit(0)
+    if '-ojf' in sys.argv:
+        sys.stderr.write('error: unknown argument: -ojf\\n')
+        sys.exit(1)
+    sys.stdin.buffer.read()
+    print("[00:00:00.000 --> 00:00:01.000]   hello")
+"""
+
+AUDIO = np.zeros(16000, dtype=np.float32)
+
+
+def test_text_only_calls_skip_json_output(make_stub, tmp_path):
+    log = tmp_path / 'args'
+    with SubprocessWhisper('model.bin', exe_path=make_stub('main', JSON_CLI_STUB.format(log=str(log)))) as backend:
+        segments = backend.transcribe_segments(AUDIO)
+    assert [s.text for s in segments] == ['hello']
+    assert segments[0].confidence is None
+    assert '-ojf' not in log.read_text()
+
+
+def test_confidence_uses_json_output(make_stub, tmp_path):
+    log = tmp_path / 'args'
+    exe = make_stub('main', JSON_CLI_STUB.format(log=str(log)))
+    with SubprocessWhisper('model.bin', exe_path=exe, confidence=True) as backend:
+        segments = backend.transcribe_segments(AUDIO)
+        assert backend.capabilities.confidence
+        # Nothing is left behind in the output folder
+        assert not os.listdir(backend._output_dir)
+    assert segments[0].confidence == 0.5
+
+
+def test_build_without_json_output_falls_back_to_printed_lines(make_stub):
+    with SubprocessWhisper('model.bin', exe_path=make_stub('main', PLAIN_CLI_STUB), confidence=True) as backend:
+        assert not backend.capabilities.confidence
+        assert [s.text for s in backend.transcribe_segments(AUDIO)] == ['hello']
+
+
+def server_backend(make_stub, tmp_path, modes):
+    starts = tmp_path / 'starts'
+    exe = make_stub('whisper-server', SERVER_STUB.format(modes=modes, starts=str(starts)))
+    backend = PersistentWhisper('model.bin', server_path=exe, request_timeout=1.0, timeout_per_second=0.0)
+    return backend, starts
+
+
+def started_pids(starts):
+    return [int(pid) for pid in starts.read_text().split()]
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+@pytest.mark.parametrize('failure', ['hang', 'exit'])
+def test_failed_server_is_restarted_and_retried_once(make_stub, tmp_path, failure):
+    backend, starts = server_backend(make_stub, tmp_path, [failure, 'ok'])
+    with backend:
+        assert [s.text for s in backend.transcribe_segments(AUDIO)] == ['hello']
+        first, second = started_pids(starts)
+        assert not is_running(first)
+        assert backend.process.pid == second
+
+
+def test_server_that_hangs_again_is_stopped(make_stub, tmp_path):
+    backend, starts = server_backend(make_stub, tmp_path, ['hang'])
+    with backend:
+        with pytest.raises(socket.timeout):
+            backend.transcribe_segments(AUDIO)
+        # One retry, then the hung worker is stopped rather than left for the next call
+        assert len(started_pids(starts)) == 2
+        assert not any(is_running(pid) for pid in started_pids(starts))
+        assert backend.process is None
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from vad import speech_mask, trim_silence
+
+SAMPLE_RATE = 16000
+
+
+def synthetic_speech(seconds, gain, seed=0):
+    """Syllable-like voiced bursts between pauses, over faint noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = np.clip(np.sin(2 * np.pi * 3 * t), 0, None) * (t > 0.5) * (t < seconds - 0.5)
+    voiced = np.sin(2 * np.pi * 150 * t) + 0.5 * np.sin(2 * np.pi * 450 * t)
+    noise = 1e-4 * rng.standard_normal(len(t))
+    return (gain * envelope * voiced + noise).astype(np.float32)
+
+
+@pytest.mark.parametrize('gain', [0.5, 0.03, 0.005])
+def test_speech_is_found_at_any_level(gain):
+    audio = synthetic_speech(3.0, gain)
+    result = trim_silence(audio, SAMPLE_RATE)
+    assert result.has_speech
+    # The silent half second at each end is trimmed
+    assert result.removed_seconds > 0.5
+
+
+def test_noise_alone_is_not_speech():
+    noise = 1e-4 * np.random.default_rng(1).standard_normal(3 * SAMPLE_RATE).astype(np.float32)
+    assert not trim_silence(noise, SAMPLE_RATE).has_speech
+
+
+@pytest.mark.parametrize('frames', [2, 5, 12, 13, 14, 40])
+def test_mask_matches_frame_count(frames):
+    frame_len = SAMPLE_RATE * 30 // 1000
+    audio = np.zeros(frames * frame_len, dtype=np.float32)
+    audio[:frame_len] = 0.5 * np.sin(np.arange(frame_len) * 0.3)
+    mask, _ = speech_mask(audio, SAMPLE_RATE)
+    assert len(mask) == frames
+    # Hangover extends the first frame's speech forwards by up to six frames
+    assert mask[:min(frames, 7)].all()
+    assert not mask[7:].any()
@@ -0,0 +1,265 @@
+import sys
+import time
+import ctypes
+from ctypes import wintypes
+from tracing import span, annotate
+
+IS_WINDOWS = sys.platform == 'win32'
+
+# Virtual-key codes and flags used with SendInput
+VK_SHIFT = 0x10
+VK_CONTROL = 0x11
+VK_MENU = 0x12
+VK_LWIN = 0x5B
+VK_RWIN = 0x5C
+VK_V = 0x56
+INPUT_KEYBOARD = 1
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_UNICODE = 0x0004
+CF_UNICODETEXT = 13
+GMEM_MOVEABLE = 0x0002
+
+ULONG_PTR = ctypes.c_size_t
+
+
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [
+        ("wVk", wintypes.WORD),
+        ("wScan", wintypes.WORD),
+        ("dwFlags", wintypes.DWORD),
+        ("time", wintypes.DWORD),
+        ("dwExtraInfo", ULONG_PTR),
+    ]
+
+
+class MOUSEINPUT(ctypes.Structure):
+    # Only declared so the INPUT union has the size Windows expects
+    _fields_ = [
+        ("dx", wintypes.LONG),
+        ("dy", wintypes.LONG),
+        ("mouseData", wintypes.DWORD),
+        ("dwFlags", wintypes.DWORD),
+        ("time", wintypes.DWORD),
+        ("dwExtraInfo", ULONG_PTR),
+    ]
+
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [("ki", KEYBDINPUT), ("mi", MOUSEINPUT)]
+
+
+class INPUT(ctypes.Structure):
+    _fields_ = [("type", wintypes.DWORD), ("union", _INPUTUNION)]
+
+
+def _key_input(vk=0, scan=0, flags=0):
+    """Build one keyboard INPUT record"""
+    return INPUT(type=INPUT_KEYBOARD, union=_INPUTUNION(ki=KEYBDINPUT(wVk=vk, wScan=scan, dwFlags=flags)))
+
+
+def _send_inputs(inputs):
+    """Send a list of INPUT records to the foreground window in one call"""
+    array = (INPUT * len(inputs))(*inputs)
+    sent = ctypes.windll.user32.SendInput(len(inputs), array, ctypes.sizeof(INPUT))
+    if sent != len(inputs):
+        raise OSError(f"SendInput inserted {sent} of {len(inputs)} events")
+
+
+class PerKeyTyping:
+    """Original behaviour: one pyautogui keystroke per character"""
+    name = 'typing'
+
+    def insert(self, text):
+        import pyautogui
+        pyautogui.write(text)
+
+
+class BatchedKeystrokes:
+    """Injects the whole text as unicode key events in a single SendInput call"""
+    name = 'keystrokes'
+
+    def insert(self, text):
+        if not IS_WINDOWS:
+            # pynput types without pyautogui's per-key pause
+            from pynput.keyboard import Controller
+            Controller().type(text)
+            return
+
+        inputs = []
+        for unit in _utf16_units(text):
+            inputs.append(_key_input(scan=unit, flags=KEYEVENTF_UNICODE))
+            inputs.append(_key_input(scan=unit, flags=KEYEVENTF_UNICODE | KEYEVENTF_KEYUP))
+        _send_inputs(inputs)
+
+
+class ClipboardPaste:
+    """Pastes the text with Ctrl+V (Cmd+V on macOS), then restores the previous clipboard text"""
+    name = 'clipboard'
+
+    def __init__(self, restore_delay=0.15, clipboard=None):
+        # Target apps read the clipboard asynchronously after Ctrl+V
+        self.restore_delay = restore_delay
+        # (get_text, set_text) used off Windows, e.g. Qt's clipboard via the GUI thread
+        self.clipboard = clipboard
+
+    def insert(self, text):
+        if IS_WINDOWS:
+            get_text, set_text = _get_clipboard_text, _set_clipboard_text
+        elif self.clipboard is not None:
+            get_text, set_text = self.clipboard
+        else:
+            raise RuntimeError("No clipboard access on this platform")
+
+        previous = get_text()
+        set_text(text)
+        _press_paste()
+        time.sleep(self.restore_delay)
+        # Only text can be restored; other clipboard formats are lost
+        if previous is not None:
+            set_text(previous)
+
+
+STRATEGIES = {
+    ClipboardPaste.name: ClipboardPaste,
+    BatchedKeystrokes.name: BatchedKeystrokes,
+    PerKeyTyping.name: PerKeyTyping,
+}
+
+
+class TextInserter:
+    """Inserts text at the cursor using the configured strategy, falling back to typing"""
+    def __init__(self, strategy='clipboard', modifiers_released=None, ready_timeout=0.5,
+                 clipboard=None):
+        self.strategy = strategy
+        # Fallback check for platforms where key state cannot be queried directly
+        self.modifiers_released = modifiers_released
+        self.ready_timeout = ready_timeout
+        self.last_timing = {}
+        self._strategies = {name: cls() for name, cls in STRATEGIES.items()}
+        self._strategies[ClipboardPaste.name] = ClipboardPaste(clipboard=clipboard)
+
+    def wait_until_ready(self):
+        """Wait until the hotkey modifiers are released so they don't combine with the text"""
+        deadline = time.perf_counter() + self.ready_timeout
+        while not self._keys_released():
+            if time.perf_counter() >= deadline:
+                print("Modifier keys still held - inserting anyway")
+                return False
+            time.sleep(0.01)
+        return True
+
+    def insert(self, text):
+        """Insert text and return the seconds spent in the strategy itself"""
+        wait_start = time.perf_counter()
+        with span('insert_wait'):
+            self.wait_until_ready()
+        waited = time.perf_counter() - wait_start
+
+        order = [self.strategy] + [name for name in (PerKeyTyping.name,) if name != self.strategy]
+        for name in order:
+            start = time.perf_counter()
+            try:
+                with span(f'insert_{name}'):
+                    self._strategies[name].insert(text)
+            except Exception as e:
+                print(f"Text insertion with '{name}' failed: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            self.last_timing = {'strategy': name, 'wait': waited, 'insert': elapsed}
+            annotate(insert_strategy=name, chars=len(text))
+            print(f"Inserted {len(text)} chars with '{name}' in {elapsed * 1000:.1f} ms "
+                  f"(waited {waited * 1000:.1f} ms for keys)")
+            return elapsed
+
+        raise RuntimeError("All text insertion strategies failed")
+
+    def _keys_released(self):
+        """Check whether Alt/Ctrl/Shift/Win are all up"""
+        if IS_WINDOWS:
+            state = ctypes.windll.user32.GetAsyncKeyState
+            return not any(state(vk) & 0x8000 for vk in (VK_MENU, VK_CONTROL, VK_SHIFT, VK_LWIN, VK_RWIN))
+        if self.modifiers_released is not None:
+            return self.modifiers_released()
+        return True
+
+
+def _utf16_units(text):
+    """Split text into UTF-16 code units, as KEYEVENTF_UNICODE expects"""
+    data = text.encode('utf-16-le')
+    return [int.from_bytes(data[i:i + 2], 'little') for i in range(0, len(data), 2)]
+
+
+def _press_paste():
+    """Send the platform's paste shortcut to the focused window"""
+    if IS_WINDOWS:
+        _send_inputs([
+            _key_input(vk=VK_CONTROL),
+            _key_input(vk=VK_V),
+            _key_input(vk=VK_V, flags=KEYEVENTF_KEYUP),
+            _key_input(vk=VK_CONTROL, flags=KEYEVENTF_KEYUP),
+        ])
+        return
+    from pynput.keyboard import Controller, Key
+    keyboard = Controller()
+    with keyboard.pressed(Key.cmd if sys.platform == 'darwin' else Key.ctrl):
+        keyboard.press('v')
+        keyboard.release('v')
+
+
+def _get_clipboard_text():
+    """Return the clipboard's unicode text, or None if it holds no text"""
+    user32, kernel32 = _clipboard_api()
+    if not user32.OpenClipboard(None):
+        raise OSError("Could not open clipboard")
+    try:
+        handle = user32.GetClipboardData(CF_UNICODETEXT)
+        if not handle:
+            return None
+        pointer = kernel32.GlobalLock(handle)
+        try:
+            return ctypes.wstring_at(pointer)
+        finally:
+            kernel32.GlobalUnlock(handle)
+    finally:
+        user32.CloseClipboard()
+
+
+def _set_clipboard_text(text):
+    """Replace the clipboard contents with unicode text"""
+    user32, kernel32 = _clipboard_api()
+    data = text.encode('utf-16-le') + b'\x00\x00'
+    handle = kernel32.GlobalAlloc(GMEM_MOVEABLE, len(data))
+    if not handle:
+        raise MemoryError("GlobalAlloc failed")
+    pointer = kernel32.GlobalLock(handle)
+    ctypes.memmove(pointer, data, len(data))
+    kernel32.GlobalUnlock(handle)
+
+    if not user32.OpenClipboard(None):
+        kernel32.GlobalFree(handle)
+        raise OSError("Could not open clipboard")
+    try:
+        user32.EmptyClipboard()
+        # On success the clipboard owns the memory
+        if not user32.SetClipboardData(CF_UNICODETEXT, handle):
+            kernel32.GlobalFree(handle)
+            raise OSError("SetClipboardData failed")
+    finally:
+        user32.CloseClipboard()
+
+
+def _clipboard_api():
+    """Return user32/kernel32 with pointer-sized return types declared"""
+    user32 = ctypes.windll.user32
+    kernel32 = ctypes.windll.kernel32
+    user32.GetClipboardData.restype = wintypes.HANDLE
+    user32.SetClipboardData.argtypes = [wintypes.UINT, wintypes.HANDLE]
+    user32.SetClipboardData.restype = wintypes.HANDLE
+    user32.OpenClipboard.argtypes = [wintypes.HWND]
+    kernel32.GlobalAlloc.argtypes = [wintypes.UINT, ctypes.c_size_t]
+    kernel32.GlobalAlloc.restype = wintypes.HGLOBAL
+    kernel32.GlobalLock.argtypes = [wintypes.HGLOBAL]
+    kernel32.GlobalLock.restype = ctypes.c_void_p
+    kernel32.GlobalUnlock.argtypes = [wintypes.HGLOBAL]
+    kernel32.GlobalFree.argtypes = [wintypes.HGLOBAL]
+    return user32, kernel32
@@ -0,0 +1,147 @@
+import collections
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+class Trace:
+    """Per-stage timing spans for one dictation, from hotkey to inserted text"""
+    def __init__(self, kind='dictation'):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.wall_time = time.time()
+        self.start = time.perf_counter()
+        self.spans = []
+        self.attributes = {}
+
+    def add(self, name, start, end=None):
+        """Record a span from perf_counter timestamps, e.g. one measured across threads"""
+        if end is None:
+            end = time.perf_counter()
+        self.spans.append((name, start - self.start, end - start))
+
+    @contextmanager
+    def span(self, name):
+        """Time the enclosed block as a named stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start)
+
+    @contextmanager
+    def activate(self):
+        """Make this the current thread's trace so nested code can add spans"""
+        previous = getattr(_local, 'trace', None)
+        _local.trace = self
+        try:
+            yield self
+        finally:
+            _local.trace = previous
+
+    def to_dict(self):
+        """Serialize the trace for the JSONL log; times are in milliseconds"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'time': self.wall_time,
+            'total_ms': round((time.perf_counter() - self.start) * 1000, 3),
+            'spans': [
+                {'name': name, 'offset_ms': round(offset * 1000, 3), 'ms': round(duration * 1000, 3)}
+                for name, offset, duration in self.spans
+            ],
+            **self.attributes,
+        }
+
+
+def current_trace():
+    """Return the trace active on this thread, or None"""
+    return getattr(_local, 'trace', None)
+
+
+@contextmanager
+def span(name):
+    """Time a stage in the current thread's trace; a no-op when none is active"""
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, start)
+
+
+def annotate(**attributes):
+    """Attach extra fields to the current thread's trace, if any"""
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+class TraceLog:
+    """Writes finished traces to a rotating JSONL file and keeps recent ones for stats"""
+    def __init__(self, path, max_bytes=1024 * 1024, backup_count=3, keep=500):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self._logger = logging.getLogger(f'whisper_trace.{path}')
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        if not self._logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self._logger.addHandler(handler)
+
+        self._recent = collections.deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def record(self, trace):
+        """Append a finished trace to the log"""
+        data = trace.to_dict()
+        with self._lock:
+            self._recent.append(data)
+        self._logger.info(json.dumps(data))
+        return data
+
+    def stats(self, kind='dictation'):
+        """Return {stage: {'count', 'p50', 'p95'}} in milliseconds over recent traces of a kind"""
+        # Imported here so tracing stays cheap to import at startup
+        import numpy as np
+        durations = collections.defaultdict(list)
+        with self._lock:
+            recent = list(self._recent)
+        for data in recent:
+            if data['kind'] != kind:
+                continue
+            durations['total'].append(data['total_ms'])
+            for item in data['spans']:
+                durations[item['name']].append(item['ms'])
+
+        return {
+            name: {
+                'count': len(values),
+                'p50': float(np.percentile(values, 50)),
+                'p95': float(np.percentile(values, 95)),
+            }
+            for name, values in durations.items()
+        }
+
+    def format_stats(self):
+        """Render stats() as a small text table"""
+        stats = self.stats()
+        if not stats:
+            return "No dictations recorded yet"
+        lines = [f"{'stage':<20}{'n':>5}{'p50 ms':>10}{'p95 ms':>10}"]
+        for name, s in sorted(stats.items(), key=lambda item: item[0] == 'total'):
+            lines.append(f"{name:<20}{s['count']:>5}{s['p50']:>10.1f}{s['p95']:>10.1f}")
+        return '\n'.join(lines)
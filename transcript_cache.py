@@ -0,0 +1,186 @@
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import numpy as np
+from segments import Segment
+from backends import Backend
+
+
+def default_cache_path():
+    """Per-user location of the on-disk transcript cache"""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'whisper-scribe', 'transcripts.sqlite')
+
+
+def model_fingerprint(model_path):
+    """Identify a model file by path, size and mtime so a replaced file misses"""
+    try:
+        st = os.stat(model_path)
+        return f"{os.path.abspath(model_path)}:{st.st_size}:{st.st_mtime_ns}"
+    except OSError:
+        return os.path.abspath(model_path)
+
+
+def cache_key(audio, model, params=None):
+    """Content hash of float32 PCM together with the model and decoding parameters"""
+    samples = np.ascontiguousarray(audio, dtype=np.float32)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(json.dumps([model, params or {}], sort_keys=True).encode('utf-8'))
+    digest.update(memoryview(samples).cast('B'))
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    """Content-addressed transcript store: an LRU dict in front of a size-bounded SQLite file"""
+    def __init__(self, path=None, max_bytes=64 * 1024 * 1024, memory_entries=256, enabled=True):
+        self.path = path or default_cache_path()
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        # Bypass switch: when off, lookups miss and nothing is stored
+        self.enabled = enabled
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # Worker processes open the same file, so wait on their writes rather than fail
+        self._db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS transcripts '
+                         '(key TEXT PRIMARY KEY, value TEXT, size INTEGER, used REAL)')
+        self._db.commit()
+        self._size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM transcripts').fetchone()[0]
+
+    def get(self, key):
+        """Return cached segments for a key, or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            segments = self._memory.get(key)
+            if segments is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return segments
+
+            row = self._db.execute('SELECT value FROM transcripts WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute('UPDATE transcripts SET used = ? WHERE key = ?', (time.time(), key))
+            self._db.commit()
+            segments = [Segment(*item) for item in json.loads(row[0])]
+            self._remember(key, segments)
+            self.hits += 1
+            self.disk_hits += 1
+            return segments
+
+    def put(self, key, segments):
+        """Store segments under a key, evicting least recently used entries past max_bytes"""
+        if not self.enabled:
+            return
+        value = json.dumps([[s.start, s.end, s.text, s.confidence] for s in segments])
+        with self._lock:
+            self._remember(key, segments)
+            old = self._db.execute('SELECT size FROM transcripts WHERE key = ?', (key,)).fetchone()
+            self._db.execute('INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?)',
+                             (key, value, len(value), time.time()))
+            self._size += len(value) - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def stats(self):
+        """Hit/miss counters and current sizes"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'memory_entries': len(self._memory),
+                'disk_bytes': self._size,
+            }
+
+    def clear(self):
+        """Drop every cached transcript"""
+        with self._lock:
+            self._memory.clear()
+            self._db.execute('DELETE FROM transcripts')
+            self._db.commit()
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _remember(self, key, segments):
+        self._memory[key] = segments
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        """Delete the oldest entries until the store is back under 90% of max_bytes"""
+        target = self.max_bytes * 0.9
+        # Other processes may have written to the file since our total was taken
+        self._size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM transcripts').fetchone()[0]
+        rows = self._db.execute('SELECT key, size FROM transcripts ORDER BY used').fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+        self._db.executemany('DELETE FROM transcripts WHERE key = ?', evicted)
+
+
+class CachedBackend(Backend):
+    """Wraps a transcription backend so repeated audio is answered from the cache"""
+    def __init__(self, backend, cache, model_path, params=None, sample_rate=16000):
+        # The wrapped backend, for callers that must always run inference
+        self.uncached = backend
+        self.capabilities = backend.capabilities
+        self.kind = backend.kind
+        self.cache = cache
+        self._model = model_fingerprint(model_path)
+        self._params = {'backend': type(backend).__name__, **(params or {})}
+        self.sample_rate = sample_rate
+        # Called with (audio seconds, elapsed seconds) after each real inference;
+        # hits take no time and would skew a speed estimate
+        self.on_inference = None
+
+    def transcribe_segments(self, audio_data):
+        key = cache_key(audio_data, self._model, self._params)
+        segments = self.cache.get(key)
+        if segments is None:
+            # Backends raise on failure here, so error text is never cached as a transcript
+            start = time.perf_counter()
+            segments = self.uncached.transcribe_segments(audio_data)
+            if self.on_inference is not None:
+                self.on_inference(len(audio_data) / self.sample_rate, time.perf_counter() - start)
+            self.cache.put(key, segments)
+        return segments
+
+    def warm_up(self, seconds=2.0, sample_rate=16000):
+        # Go around the cache, which would answer without touching the model
+        self.uncached.warm_up(seconds, sample_rate)
+
+    def close(self):
+        self.uncached.close()
+
+    def __getattr__(self, name):
+        # close(), is_alive() and friends go to the wrapped backend
+        if name == 'uncached':
+            raise AttributeError(name)
+        return getattr(self.uncached, name)
@@ -0,0 +1,75 @@
+import queue
+import time
+import traceback
+from PySide6.QtCore import QCoreApplication, QThread, Signal
+from tracing import Trace
+
+
+class TranscriptionJob:
+    """A finished recording waiting to be transcribed"""
+    def __init__(self, audio, streamer=None, trace=None):
+        self.audio = audio
+        self.streamer = streamer
+        self.trace = trace
+        self.queued_at = time.perf_counter()
+
+
+class TranscriptionWorker(QThread):
+    """Transcribes queued recordings in order, off the Qt event loop"""
+    transcribed = Signal(str)
+    failed = Signal(str)
+
+    def __init__(self, pipeline, insert_text, trace_log=None):
+        super().__init__()
+        self.pipeline = pipeline
+        # Called on this thread with each non-empty transcription
+        self.insert_text = insert_text
+        self.trace_log = trace_log
+        self.jobs = queue.Queue()
+
+    def submit(self, audio, streamer=None, trace=None):
+        """Queue a recording; jobs are processed and inserted in submission order"""
+        self.jobs.put(TranscriptionJob(audio, streamer, trace))
+
+    def run(self):
+        """Process jobs until stop() is called"""
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            trace = job.trace or Trace()
+            trace.add('queue_wait', job.queued_at)
+            try:
+                with trace.activate():
+                    text = self.pipeline.run(job.audio, job.streamer)
+                    if text:
+                        self.insert_text(text)
+                self.transcribed.emit(text)
+            except Exception as e:
+                print(f"Error during transcription: {e}")
+                traceback.print_exc()
+                trace.attributes['error'] = str(e)
+                self.failed.emit(str(e))
+            finally:
+                # Recordings spilled to disk delete their file here
+                if hasattr(job.audio, 'close'):
+                    job.audio.close()
+            if self.trace_log:
+                self.trace_log.record(trace)
+
+    def stop(self, timeout=None):
+        """Finish the queued jobs, then exit the thread
+
+        Called from the GUI thread, which keeps processing events while it
+        waits since inserting text may need it. Returns False if the thread is
+        still running after timeout seconds.
+        """
+        if not self.isRunning():
+            return True
+        self.jobs.put(None)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.wait(50):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            QCoreApplication.processEvents()
+        return True
@@ -0,0 +1,137 @@
+from dataclasses import dataclass
+import numpy as np
+
+
+@dataclass
+class VadResult:
+    """Audio left after silence trimming and how much was removed"""
+    audio: np.ndarray
+    removed_seconds: float
+    has_speech: bool
+
+
+def frame_features(audio, frame_len):
+    """Return per-frame mean energy and zero-crossing rate for whole frames of audio"""
+    n_frames = len(audio) // frame_len
+    frames = audio[:n_frames * frame_len].reshape(n_frames, frame_len)
+    energy = np.einsum('ij,ij->i', frames, frames) / frame_len
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_len
+    return energy, zcr
+
+
+def speech_mask(audio, sample_rate=16000, frame_ms=30, energy_threshold=1e-4,
+                noise_factor=4.0, peak_ratio=0.01, zcr_range=(0.1, 0.5), hangover_ms=200):
+    """Classify fixed-size frames of audio as speech (True) or silence (False)"""
+    frame_len = int(sample_rate * frame_ms / 1000)
+    energy, zcr = frame_features(np.asarray(audio, dtype=np.float32), frame_len)
+    if len(energy) == 0:
+        return np.zeros(0, dtype=bool), frame_len
+
+    # Adapt to the room: the quietest frames approximate the noise floor. The
+    # fixed floor is capped at a fraction of the loudest frame, so a quiet
+    # microphone is judged against its own level instead of losing all speech
+    noise_floor = np.percentile(energy, 10)
+    threshold = max(min(energy_threshold, energy.max() * peak_ratio), noise_floor * noise_factor)
+
+    # Voiced speech is loud; unvoiced consonants are quieter but noisy, and must
+    # still clear the noise floor by enough that the background itself doesn't pass
+    voiced = energy > threshold
+    unvoiced = ((energy > max(threshold / 4, noise_floor * 2))
+                & (zcr >= zcr_range[0]) & (zcr <= zcr_range[1]))
+    mask = voiced | unvoiced
+
+    # Keep a little audio around each speech frame so word edges survive
+    hangover = max(1, int(hangover_ms / frame_ms))
+    if mask.any():
+        # A full convolution sliced back to the mask, since mode='same' returns
+        # the kernel's length for clips shorter than it
+        mask = np.convolve(mask, np.ones(2 * hangover + 1))[hangover:hangover + len(mask)] > 0
+    return mask, frame_len
+
+
+def trim_silence(audio, sample_rate=16000, max_pause_seconds=None, **kwargs):
+    """Trim leading/trailing silence and optionally squeeze long internal pauses"""
+    mask, frame_len = speech_mask(audio, sample_rate, **kwargs)
+    total = len(audio)
+    if not mask.any():
+        return VadResult(audio[:0], total / sample_rate, False)
+
+    speech_frames = np.flatnonzero(mask)
+    start = speech_frames[0] * frame_len
+    end = min(total, (speech_frames[-1] + 1) * frame_len)
+    # A partial frame at the end counts as speech if the last whole frame was
+    if speech_frames[-1] == len(mask) - 1:
+        end = total
+
+    if max_pause_seconds is None:
+        # A plain slice keeps this zero-copy
+        trimmed = audio[start:end]
+    else:
+        trimmed = _squeeze_pauses(audio, mask, frame_len, start, end,
+                                  int(max_pause_seconds * sample_rate))
+
+    return VadResult(trimmed, (total - len(trimmed)) / sample_rate, True)
+
+
+def _squeeze_pauses(audio, mask, frame_len, start, end, max_pause):
+    """Shorten every silent run inside [start, end) to at most max_pause samples"""
+    # Find silent runs between the first and last speech frames
+    first, last = start // frame_len, (end - 1) // frame_len
+    silent = np.concatenate(([0], ~mask[first:last + 1], [0])).astype(np.int8)
+    edges = np.diff(silent)
+    run_starts = (np.flatnonzero(edges == 1) + first) * frame_len
+    run_ends = (np.flatnonzero(edges == -1) + first) * frame_len
+
+    pieces = []
+    cursor = start
+    for run_start, run_end in zip(run_starts, run_ends):
+        if run_end - run_start <= max_pause:
+            continue
+        # Keep half of the allowed pause on each side of the cut
+        keep = max_pause // 2
+        pieces.append(audio[cursor:run_start + keep])
+        cursor = run_end - (max_pause - keep)
+    pieces.append(audio[cursor:end])
+
+    if len(pieces) == 1:
+        return pieces[0]
+    return np.concatenate(pieces)
+
+
+def split_on_pauses(audio, sample_rate=16000, target_seconds=30.0, min_seconds=10.0,
+                    max_seconds=45.0, **kwargs):
+    """Split audio into (start, end) sample ranges, cutting in the middle of pauses"""
+    # Each chunk ends at the pause closest to target_seconds within
+    # [min_seconds, max_seconds]; without a pause it is cut at max_seconds
+    mask, frame_len = speech_mask(audio, sample_rate, hangover_ms=0, **kwargs)
+    total = len(audio)
+
+    # Candidate cut points: the middle of every silent run
+    silent = np.concatenate(([0], ~mask, [0])).astype(np.int8)
+    edges = np.diff(silent)
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    cuts = ((run_starts + run_ends) // 2) * frame_len
+    # Longer pauses are safer places to cut
+    lengths = run_ends - run_starts
+
+    target = int(target_seconds * sample_rate)
+    min_len = int(min_seconds * sample_rate)
+    max_len = int(max_seconds * sample_rate)
+
+    ranges = []
+    start = 0
+    while total - start > max_len:
+        window = (cuts >= start + min_len) & (cuts <= start + max_len)
+        if window.any():
+            candidates = np.flatnonzero(window)
+            # Prefer cuts near the target, breaking ties towards longer pauses
+            cost = np.abs(cuts[candidates] - (start + target)) - lengths[candidates] * frame_len
+            end = int(cuts[candidates[np.argmin(cost)]])
+        else:
+            end = start + max_len
+        ranges.append((start, end))
+        start = end
+    ranges.append((start, total))
+    return ranges
@@ -1,44 +1,136 @@
 import os
+import sys
+import functools
+import threading
 import numpy as np
 import ctypes
-from ctypes import c_int, c_float, c_char_p, c_bool, POINTER, Structure, byref
-
-# Print current directory for debugging
-print(f"Current directory: {os.path.dirname(__file__)}")
-
-# Look for the DLL in the project root folder ONLY
-_lib_path = os.path.join(os.path.dirname(__file__), 'whisper.dll')
-print(f"Looking for whisper.dll at: {_lib_path}")
-
-if not os.path.exists(_lib_path):
-    print(f"Error: whisper.dll not found at {_lib_path}")
-    print("Please download the DLL file to your project directory.")
-    raise RuntimeError(f"Whisper library not found at {_lib_path}")
-
-# Load the library and print all available functions
-try:
-    print(f"Loading whisper.dll from: {_lib_path}")
-    _lib = ctypes.CDLL(_lib_path)
-    print("Successfully loaded whisper.dll")
-    
-    # Try to list available functions - this may not work on all systems
+from ctypes import (c_int, c_int64, c_float, c_char_p, c_bool, c_size_t, c_void_p,
+                    POINTER, Structure)
+from segments import Segment, clean_segments, join_segments
+from backends import Backend, Capabilities
+
+# The struct layouts below match whisper.h from whisper.cpp 1.7.1
+WHISPER_CPP_VERSION = "1.7.1"
+# Releases whose whisper.h has been checked against these layouts; add a
+# version here only after comparing its structs field by field
+SUPPORTED_VERSIONS = (WHISPER_CPP_VERSION,)
+WHISPER_SAMPLING_GREEDY = 0
+
+# Functions the in-process backend cannot work without
+REQUIRED_FUNCTIONS = (
+    'whisper_full',
+    'whisper_full_default_params',
+    'whisper_full_n_segments',
+    'whisper_full_get_segment_text',
+    'whisper_full_get_segment_t0',
+    'whisper_full_get_segment_t1',
+    'whisper_free',
+)
+
+# Platform-specific name of the shared library in the project root folder
+if sys.platform == 'win32':
+    LIBRARY_NAME = 'whisper.dll'
+elif sys.platform == 'darwin':
+    LIBRARY_NAME = 'libwhisper.dylib'
+else:
+    LIBRARY_NAME = 'libwhisper.so'
+
+
+def library_path():
+    """Path the whisper shared library is loaded from"""
+    return os.path.join(os.path.dirname(__file__), LIBRARY_NAME)
+
+
+@functools.lru_cache(maxsize=None)
+def load_library():
+    """Load the whisper shared library once and declare its function signatures"""
+    path = library_path()
+    if not os.path.exists(path):
+        raise RuntimeError(f"Whisper library not found at {path}")
+
+    print(f"Loading {LIBRARY_NAME} from: {path}")
+    lib = ctypes.CDLL(path)
+    _declare_functions(lib)
+    return lib
+
+
+@functools.lru_cache(maxsize=None)
+def probe():
+    """Return (available, reason) for the in-process backend without loading a model"""
     try:
-        print("Available functions in the DLL:")
-        for name in dir(_lib):
-            if not name.startswith('_'):
-                print(f"  {name}")
+        lib = load_library()
     except Exception as e:
-        print(f"Could not list functions: {e}")
-        
-except Exception as e:
-    print(f"Failed to load whisper.dll: {e}")
-    raise
+        return False, str(e)
+
+    missing = [name for name in REQUIRED_FUNCTIONS if not hasattr(lib, name)]
+    if missing:
+        return False, f"{LIBRARY_NAME} does not export {', '.join(missing)}"
+    if not (hasattr(lib, 'whisper_init_from_file_with_params') or hasattr(lib, 'whisper_init_from_file')):
+        return False, f"{LIBRARY_NAME} has no whisper_init_from_file function"
+
+    # Any other whisper.cpp release, patch releases included, may lay out
+    # whisper_full_params differently, and passing it by value with the wrong
+    # layout corrupts memory rather than failing
+    if not hasattr(lib, 'whisper_version'):
+        return False, f"{LIBRARY_NAME} does not report its version, bindings expect {WHISPER_CPP_VERSION}"
+    version = (lib.whisper_version() or b'').decode(errors='replace')
+    if version not in SUPPORTED_VERSIONS:
+        return False, f"{LIBRARY_NAME} is whisper.cpp {version}, bindings expect {WHISPER_CPP_VERSION}"
+    return True, "ok"
+
+
+@functools.lru_cache(maxsize=None)
+def get_backend_class():
+    """Return Whisper if the in-process backend is usable, otherwise DummyWhisper"""
+    available, reason = probe()
+    if available:
+        print("Using real Whisper implementation")
+        return Whisper
+    print(f"In-process whisper unavailable ({reason}), falling back to dummy implementation")
+    return DummyWhisper
+
+
+def __getattr__(name):
+    # WhisperImpl used to be resolved at import time; keep it as a lazy alias
+    if name == 'WhisperImpl':
+        return get_backend_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Define whisper_context structure (opaque pointer)
 class whisper_context(Structure):
     pass
 
-# Simple whisper_full_params structure with minimum required fields
+class whisper_aheads(Structure):
+    _fields_ = [
+        ("n_heads", c_size_t),
+        ("heads", c_void_p),
+    ]
+
+class whisper_context_params(Structure):
+    _fields_ = [
+        ("use_gpu", c_bool),
+        ("flash_attn", c_bool),
+        ("gpu_device", c_int),
+        ("dtw_token_timestamps", c_bool),
+        ("dtw_aheads_preset", c_int),
+        ("dtw_n_top", c_int),
+        ("dtw_aheads", whisper_aheads),
+        ("dtw_mem_size", c_size_t),
+    ]
+
+class whisper_greedy_params(Structure):
+    _fields_ = [
+        ("best_of", c_int),
+    ]
+
+class whisper_beam_search_params(Structure):
+    _fields_ = [
+        ("beam_size", c_int),
+        ("patience", c_float),
+    ]
+
+# Full whisper_full_params layout; it is passed to whisper_full by value, so
+# every field must be present and in order. Callbacks are left as NULL pointers.
 class whisper_full_params(Structure):
     _fields_ = [
         ("strategy", c_int),
@@ -48,89 +140,184 @@ class whisper_full_params(Structure):
         ("duration_ms", c_int),
         ("translate", c_bool),
         ("no_context", c_bool),
+        ("no_timestamps", c_bool),
         ("single_segment", c_bool),
         ("print_special", c_bool),
         ("print_progress", c_bool),
         ("print_realtime", c_bool),
         ("print_timestamps", c_bool),
+        ("token_timestamps", c_bool),
+        ("thold_pt", c_float),
+        ("thold_ptsum", c_float),
+        ("max_len", c_int),
+        ("split_on_word", c_bool),
+        ("max_tokens", c_int),
+        ("debug_mode", c_bool),
+        ("audio_ctx", c_int),
+        ("tdrz_enable", c_bool),
+        ("suppress_regex", c_char_p),
+        ("initial_prompt", c_char_p),
+        ("prompt_tokens", POINTER(c_int)),
+        ("prompt_n_tokens", c_int),
+        ("language", c_char_p),
+        ("detect_language", c_bool),
+        ("suppress_blank", c_bool),
+        ("suppress_non_speech_tokens", c_bool),
+        ("temperature", c_float),
+        ("max_initial_ts", c_float),
+        ("length_penalty", c_float),
+        ("temperature_inc", c_float),
+        ("entropy_thold", c_float),
+        ("logprob_thold", c_float),
+        ("no_speech_thold", c_float),
+        ("greedy", whisper_greedy_params),
+        ("beam_search", whisper_beam_search_params),
+        ("new_segment_callback", c_void_p),
+        ("new_segment_callback_user_data", c_void_p),
+        ("progress_callback", c_void_p),
+        ("progress_callback_user_data", c_void_p),
+        ("encoder_begin_callback", c_void_p),
+        ("encoder_begin_callback_user_data", c_void_p),
+        ("abort_callback", c_void_p),
+        ("abort_callback_user_data", c_void_p),
+        ("logits_filter_callback", c_void_p),
+        ("logits_filter_callback_user_data", c_void_p),
+        ("grammar_rules", c_void_p),
+        ("n_grammar_rules", c_size_t),
+        ("i_start_rule", c_size_t),
+        ("grammar_penalty", c_float),
     ]
 
+def _declare_functions(lib):
+    """Declare the signatures of the library functions that are exported"""
+    ctx_p = POINTER(whisper_context)
+    signatures = {
+        'whisper_version': (c_char_p, []),
+        'whisper_context_default_params': (whisper_context_params, []),
+        'whisper_init_from_file_with_params': (ctx_p, [c_char_p, whisper_context_params]),
+        'whisper_init_from_file': (ctx_p, [c_char_p]),
+        'whisper_free': (None, [ctx_p]),
+        'whisper_full_default_params': (whisper_full_params, [c_int]),
+        'whisper_full': (c_int, [ctx_p, whisper_full_params, POINTER(c_float), c_int]),
+        'whisper_full_n_segments': (c_int, [ctx_p]),
+        'whisper_full_get_segment_t0': (c_int64, [ctx_p, c_int]),
+        'whisper_full_get_segment_t1': (c_int64, [ctx_p, c_int]),
+        'whisper_full_get_segment_text': (c_char_p, [ctx_p, c_int]),
+        'whisper_full_n_tokens': (c_int, [ctx_p, c_int]),
+        'whisper_full_get_token_p': (c_float, [ctx_p, c_int, c_int]),
+    }
+    for name, (restype, argtypes) in signatures.items():
+        if hasattr(lib, name):
+            func = getattr(lib, name)
+            func.restype = restype
+            func.argtypes = argtypes
+
 # Create a simple class to handle execution
-class DummyWhisper:
+class DummyWhisper(Backend):
     """A dummy implementation that simulates transcription for testing"""
-    def __init__(self, model_path):
+    capabilities = Capabilities(persistent=True, concurrent=True)
+    kind = 'stub'
+
+    def __init__(self, model_path, sample_rate=16000):
         print(f"DummyWhisper: Pretending to load model from {model_path}")
-    
-    def transcribe(self, audio_data):
+        self.sample_rate = sample_rate
+
+    def transcribe_segments(self, audio_data):
         print(f"DummyWhisper: Pretending to transcribe {len(audio_data)} samples")
-        return "This is a test transcription. The whisper.dll functions could not be accessed properly."
+        text = "This is a test transcription. The whisper.dll functions could not be accessed properly."
+        return [Segment(0.0, len(audio_data) / self.sample_rate, text)]
 
-# Simple wrapper for whisper.cpp - try alternative function names
-class Whisper:
-    def __init__(self, model_path):
+# In-process whisper.cpp binding that keeps one context loaded across calls
+class Whisper(Backend):
+    kind = 'native'
+
+    def __init__(self, model_path, n_threads=4, language='en'):
         # Check if model exists
         print(f"Checking model file: {model_path}")
         if not os.path.exists(model_path):
             print(f"Error: Model file not found at {model_path}")
             raise FileNotFoundError(f"Model not found at {model_path}")
-        
+
+        available, reason = probe()
+        if not available:
+            raise RuntimeError(reason)
+        self._lib = _lib = load_library()
+
         print(f"Loading model from: {model_path}")
-        
-        # Try different function names that might exist in the DLL
-        init_functions = [
-            'whisper_init_from_file',
-            'whisper_load',
-            'whisper_init',
-            'whisper_init_state',
-            'whisper_model_load'
-        ]
-        
+        path = model_path.encode('utf-8')
         self.ctx = None
-        for func_name in init_functions:
-            try:
-                if hasattr(_lib, func_name):
-                    init_func = getattr(_lib, func_name)
-                    init_func.restype = POINTER(whisper_context)
-                    self.ctx = init_func(c_char_p(model_path.encode('utf-8')))
-                    if self.ctx:
-                        print(f"Successfully loaded model using {func_name}")
-                        break
-            except Exception as e:
-                print(f"Failed to initialize with {func_name}: {e}")
-        
+        if hasattr(_lib, 'whisper_init_from_file_with_params'):
+            self.ctx = _lib.whisper_init_from_file_with_params(path, _lib.whisper_context_default_params())
+        elif hasattr(_lib, 'whisper_init_from_file'):
+            self.ctx = _lib.whisper_init_from_file(path)
+
         if not self.ctx:
-            print("Error: Failed to initialize whisper context with any known function")
-            raise RuntimeError("Failed to initialize whisper context. Using dummy implementation.")
-    
+            print("Error: Failed to initialize whisper context")
+            raise RuntimeError("Failed to initialize whisper context")
+
+        # Parameters are built once and copied for each call
+        self._params = _lib.whisper_full_default_params(WHISPER_SAMPLING_GREEDY)
+        self._params.n_threads = n_threads
+        self._params.print_progress = False
+        self._params.print_realtime = False
+        self._params.print_timestamps = False
+        self._params.print_special = False
+        # Every dictation is independent of the previous one
+        self._params.no_context = True
+        self._language = language.encode('utf-8')
+        self._params.language = self._language
+
+        # A whisper context can only run one inference at a time
+        self._lock = threading.Lock()
+        self.capabilities = Capabilities(timestamps=True, confidence=True, persistent=True,
+                                         threads=n_threads)
+        print("Successfully loaded model")
+
+    def transcribe_segments(self, audio_data):
+        """Run whisper_full on float32 audio and return its segments"""
+        # Only copies if the input isn't already contiguous float32
+        samples = np.ascontiguousarray(audio_data, dtype=np.float32)
+        params = whisper_full_params.from_buffer_copy(self._params)
+
+        with self._lock:
+            result = self._lib.whisper_full(self.ctx, params,
+                                            samples.ctypes.data_as(POINTER(c_float)), len(samples))
+            if result != 0:
+                raise RuntimeError(f"whisper_full failed with code {result}")
+
+            segments = []
+            for i in range(self._lib.whisper_full_n_segments(self.ctx)):
+                text = self._lib.whisper_full_get_segment_text(self.ctx, i).decode('utf-8', errors='replace')
+                # Timestamps are in centiseconds
+                start = self._lib.whisper_full_get_segment_t0(self.ctx, i) / 100
+                end = self._lib.whisper_full_get_segment_t1(self.ctx, i) / 100
+                segments.append(Segment(start, end, text.strip(), self._confidence(i)))
+        return segments
+
     def transcribe(self, audio_data):
-        # This is a simplified implementation
-        print(f"Attempting to transcribe {len(audio_data)} samples")
-        return "This is a placeholder transcription. The real transcription function is not implemented."
-        
+        print(f"Transcribing {len(audio_data)} samples in-process")
+        return join_segments(clean_segments(self.transcribe_segments(audio_data)))
+
+    def _confidence(self, segment):
+        """Mean token probability of a segment, if the library exposes it"""
+        if not hasattr(self._lib, 'whisper_full_get_token_p'):
+            return None
+        n_tokens = self._lib.whisper_full_n_tokens(self.ctx, segment)
+        if n_tokens == 0:
+            return None
+        total = sum(self._lib.whisper_full_get_token_p(self.ctx, segment, j) for j in range(n_tokens))
+        return total / n_tokens
+
+    def close(self):
+        """Free the whisper context"""
+        if getattr(self, 'ctx', None):
+            self._lib.whisper_free(self.ctx)
+            self.ctx = None
+            print("Whisper resources freed")
+
     def __del__(self):
         """Clean up resources when the object is deleted"""
-        if hasattr(self, 'ctx') and self.ctx:
-            try:
-                if hasattr(_lib, 'whisper_free'):
-                    _lib.whisper_free(self.ctx)
-                    print("Whisper resources freed")
-                else:
-                    print("whisper_free function not found, potential memory leak")
-            except Exception as e:
-                print(f"Error freeing resources: {e}")
-
-# Determine which implementation to use
-try:
-    # Try to create a real Whisper instance
-    test_model_path = os.path.join(os.path.dirname(__file__), 'whisper.cpp', 'models', 'ggml-base.en.bin')
-    if os.path.exists(test_model_path):
-        _ = Whisper(test_model_path)
-        WhisperImpl = Whisper
-        print("Using real Whisper implementation")
-    else:
-        print(f"Test model not found at {test_model_path}, will use dummy implementation")
-        WhisperImpl = DummyWhisper
-except Exception as e:
-    print(f"Error testing Whisper implementation: {e}")
-    print("Falling back to dummy implementation")
-    WhisperImpl = DummyWhisper
\ No newline at end of file
+        try:
+            self.close()
+        except Exception as e:
+            print(f"Error freeing resources: {e}")